@@ -1,11 +1,12 @@
 # Imports
-from math import log
-from math import sqrt
-from math import exp
-from scipy.stats import norm
+from numpy import log
+from numpy import sqrt
+from numpy import exp
+from numpy import multiply
+from scipy.special import ndtr
 
 
-def price_eur_call(s, k, r, div_yield, t_terminal, t, sigma):
+def price_eur_call(s, k, r, div_yield, t_terminal, t, sigma, out = None):
 
     """
     Calculate the value of a european call option
@@ -16,18 +17,21 @@ def price_eur_call(s, k, r, div_yield, t_terminal, t, sigma):
     :param t_terminal: Terminal time
     :param t:          Starting time
     :param sigma:      Volatility
+    :param out:        Optional preallocated array to write the values into
     :return:           Value of the european call option at time t
     """
 
     # Normal CDF values of d_1 and d_2 respectively
-    F_d_1 = norm.cdf(d_1(s, k, r, div_yield, t_terminal, t, sigma))
-    F_d_2 = norm.cdf(d_2(s, k, r, div_yield, t_terminal, t, sigma))
+    d_1_value, d_2_value = d_1_d_2(s, k, r, div_yield, t_terminal, t, sigma)
+    F_d_1 = ndtr(d_1_value)
+    F_d_2 = ndtr(d_2_value)
 
     # Value of the option from the closed form solution of Black Scholes
-    V = s * exp(-1 * div_yield * (t_terminal - t)) * F_d_1 - k * exp(-1 * r * (t_terminal - t)) * F_d_2
+    V = multiply(s * exp(-1 * div_yield * (t_terminal - t)), F_d_1, out = out)
+    V -= k * exp(-1 * r * (t_terminal - t)) * F_d_2
     return V
 
-def price_eur_put(s, k, r, div_yield, t_terminal, t, sigma):
+def price_eur_put(s, k, r, div_yield, t_terminal, t, sigma, out = None):
 
     """
     Calculate the value of a european put option
@@ -38,15 +42,18 @@ def price_eur_put(s, k, r, div_yield, t_terminal, t, sigma):
     :param t_terminal: Terminal time
     :param t:          Starting time
     :param sigma:      Volatility
+    :param out:        Optional preallocated array to write the values into
     :return:           Value of the european put option at time t
     """
 
     # Normal CDF values of -d_1 and -d_2 respectively
-    F_neg_d_1 = norm.cdf(-1 * d_1(s, k, r, div_yield, t_terminal, t, sigma))
-    F_neg_d_2 = norm.cdf(-1 * d_2(s, k, r, div_yield, t_terminal, t, sigma))
+    d_1_value, d_2_value = d_1_d_2(s, k, r, div_yield, t_terminal, t, sigma)
+    F_neg_d_1 = ndtr(-1 * d_1_value)
+    F_neg_d_2 = ndtr(-1 * d_2_value)
 
     # Value of the option from the closed form solution of Black Scholes
-    V = -1 * s * exp(-1 * div_yield * (t_terminal - t)) * F_neg_d_1 + k * exp(-1 * r * (t_terminal - t)) * F_neg_d_2
+    V = multiply(k * exp(-1 * r * (t_terminal - t)), F_neg_d_2, out = out)
+    V -= s * exp(-1 * div_yield * (t_terminal - t)) * F_neg_d_1
     return V
 
 
@@ -70,4 +77,16 @@ def d_2(s, k, r, div_yield, t_terminal, t, sigma):
     Calculate d_2 as specified by Black Scholes
     """
 
-    return d_1(s, k, r, div_yield, t_terminal, t, sigma) - sigma * sqrt(t_terminal - t)
\ No newline at end of file
+    return d_1(s, k, r, div_yield, t_terminal, t, sigma) - sigma * sqrt(t_terminal - t)
+
+def d_1_d_2(s, k, r, div_yield, t_terminal, t, sigma):
+
+    """
+    Calculate d_1 and d_2 together, sharing sigma * sqrt(t_terminal - t)
+    """
+
+    sigma_sqrt_tau = sigma * sqrt(t_terminal - t)
+
+    d_1_value = (log(s / k) + (r - div_yield + sigma**2 / 2) * (t_terminal - t)) / sigma_sqrt_tau
+
+    return d_1_value, d_1_value - sigma_sqrt_tau
\ No newline at end of file
@@ -68,9 +68,9 @@ Within your command line / terminal, navigate to the folder containing the main.
 A pandas data frame should output:
 
 MC_option_value call_put    dt option_type
-0        43.226182     call   .01    american
+0        43.226183     call   .01    american
 1        37.582431      put   .01    american
-2        45.613229     call  .001    american
+2        45.613233     call  .001    american
 3        41.250757      put  .001    american
 
 '''
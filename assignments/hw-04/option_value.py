@@ -1,7 +1,7 @@
 import sys
 from option_value_dispatch import dispatch_pricing_method
 
-def price_option(s, k, r, T, call_put = "call", option_type = "european"):
+def price_option(s, k, r, T, call_put = "call", option_type = "european", div_yield = None, full_output = False):
     """Calculate the time 0 value of an option.
 
     Paths `s` are constructed from :py:func:`gbm_simulator.simulate_gbm`.
@@ -24,11 +24,18 @@ def price_option(s, k, r, T, call_put = "call", option_type = "european"):
         Specifications for the side of the option to price.
     option_type : {"european", "american"}, default "european"
         The type of option to price.
+    div_yield : double, default None
+        The dividend yield the paths were simulated with. If given, a European
+        price uses the discounted stock price at T as a control variate.
+    full_output : bool, default False
+        If True, a European price is returned together with its standard error.
 
     Returns
     ----------
     price : double
         The Monte Carlo value of the option
+    std_error : double
+        The standard error of the price. Only returned if `full_output` is True.
 
     See also
     ----------
@@ -43,10 +50,16 @@ def price_option(s, k, r, T, call_put = "call", option_type = "european"):
     if option_type not in ["european", "american"]:
         sys.exit("Option type must be 'european' or 'american'.")
 
+    if option_type == "american" and (div_yield is not None or full_output):
+        sys.exit("The control variate and standard error are only available for 'european' options.")
+
     # Get pricing method
     pricing_method = dispatch_pricing_method(call_put, option_type)
 
     # Apply pricing method
-    v_0 = pricing_method(s, k, r, T)
+    if option_type == "european":
+        v_0 = pricing_method(s, k, r, T, div_yield = div_yield, full_output = full_output)
+    else:
+        v_0 = pricing_method(s, k, r, T)
 
     return v_0
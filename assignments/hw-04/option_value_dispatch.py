@@ -1,5 +1,4 @@
 import numpy as np
-import scipy.optimize as scipy_opt
 
 def dispatch_pricing_method(call_put = "call", option_type = "european"):
     """Formulate the correct option pricing function from user inputs.
@@ -47,6 +46,12 @@ def european(call_put_option_price_at_T):
     This method discounts the time T values of the payoffs
     calculated from the simulations back to time 0, then takes an average.
 
+    When the dividend yield is given, the discounted stock price at T is used
+    as a control variate. Its mean s_0 * exp(-div_yield * T) is known, so the
+    average payoff is corrected by the optimal multiple of the error in the
+    average discounted stock price. This removes the part of the payoff variance
+    that is explained by S_T, which is most of it for in the money options.
+
     Parameters
     ----------
     call_put_option_price_at_T : function
@@ -65,7 +70,7 @@ def european(call_put_option_price_at_T):
     """
 
     # Create the European pricing function to return
-    def european_pricing_method(s, k, r, T):
+    def european_pricing_method(s, k, r, T, div_yield = None, full_output = False):
         """Price a european option from simulated values.
 
         Parameters
@@ -78,11 +83,24 @@ def european(call_put_option_price_at_T):
             The risk free interest rate to discount at.
         T : double
             The expiration date of the option. Used to discount.
+        div_yield : double, default None
+            The dividend yield the paths were simulated with. If given, the
+            discounted stock price at T is used as a control variate.
+        full_output : bool, default False
+            If True, also return the standard error of the price.
 
         Returns
         ----------
         v_0 : double
             The price of the European option
+        std_error : double
+            The standard error of the price. Only returned if `full_output` is True.
+
+        Notes
+        ----------
+        The known mean of the control is that of the exact GBM. Paths from a
+        discretized scheme, like the Euler scheme, have a slightly different mean,
+        which adds a bias of the order of the time step to the controlled price.
 
         See also
         ----------
@@ -94,11 +112,24 @@ def european(call_put_option_price_at_T):
         # This is all that is needed for European options
         s_T = s[:, -1]
 
-        # Apply call / put option value at T
-        v_T = call_put_option_price_at_T(s_T, k)
+        # Apply call / put option value at T, and discount
+        y = np.exp(- r * T) * call_put_option_price_at_T(s_T, k)
+
+        # Control variate on the discounted stock price at T, with known mean s_0 * exp(-div_yield * T)
+        if div_yield is not None:
+            x = np.exp(- r * T) * s_T
+            x_mean = s[0, 0] * np.exp(- div_yield * T)
+
+            x_variance = np.var(x, ddof = 1)
+            if x_variance > 0:
+                b = np.cov(y, x)[0, 1] / x_variance
+                y = y - b * (x - x_mean)
+
+        v_0 = np.mean(y)
 
-        # Discount
-        v_0 = np.exp(- r * T) * np.mean(v_T)
+        if full_output:
+            std_error = np.std(y, ddof = 1) / np.sqrt(y.shape[0])
+            return v_0, std_error
 
         return v_0
 
@@ -165,9 +196,9 @@ def american(call_put_option_price_at_T):
         # At i = M = T, use value at T
         v[:, -1] = call_put_option_price_at_T(s[:, -1], k)
 
-        # Basis function for continuation value
-        def basis_func_C(x, a0, a1, a2, a3):
-            return a0 + (a1 * x) + (a2 * x ** 2) + (a3 * x ** 3)
+        # Basis functions for continuation value, a0 + a1 x + a2 x^2 + a3 x^3
+        def basis_matrix_C(x):
+            return np.column_stack((np.ones(x.shape[0]), x, x ** 2, x ** 3))
 
         # Iterate backwards
         iteration = (np.arange(v.shape[1] - 2) + 1)[::-1]
@@ -178,12 +209,12 @@ def american(call_put_option_price_at_T):
             s_ik = s[:, i]
             yvalues = np.exp(-r * dt) * v[:, i + 1]
 
-            # Fit the 3rd ordered curve
-            C_fit = scipy_opt.curve_fit(basis_func_C, s_ik, yvalues)
-            params = C_fit[0]
+            # Fit the 3rd ordered curve by linear least squares
+            B = basis_matrix_C(s_ik)
+            params = np.linalg.lstsq(B, yvalues, rcond = None)[0]
 
             # Use the optimal parameters
-            C_hat = basis_func_C(s_ik, *params)
+            C_hat = B @ params
 
             # Calculate the value of the option if this was time T
             s_ik_v = call_put_option_price_at_T(s_ik, k)
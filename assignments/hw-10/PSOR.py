@@ -1,19 +1,25 @@
 import numpy as np
 from numpy.linalg import norm
+from SOR import red_black_solver
 
-def psor_solver(A, b, g, guess = None, relax_param = 1, tol = 1e-6, max_iter = 100000):
+def psor_solver(A, b, g, guess = None, relax_param = 1, tol = 1e-6, max_iter = 100000, ordering = "lexicographic"):
     '''
     This solver solves the linear system of Ax=b using PSOR.
-    It does so using the iterative approach, and not the matrix approach,
-    so there may be room for speed improvements.
+    It does so using the iterative approach, and not the matrix approach.
+    Only the neighbours of each element are visited, so a sweep is O(N).
 
     The SOR algorithm is a mix of Gauss Siedel with the previous iteration's value,
     weighted by the relaxation parameter.
 
+    With ordering = "red_black", the even (red) elements are updated first and then the
+    odd (black) elements. Elements of the same colour do not depend on each other, so
+    each half sweep is a handful of vectorized Numpy operations.
+
     Parameters
     ----------
-    A : Numpy 2D matrix
-        The 'A' matrix in Ax=b
+    A : tuple of 3 Numpy 1D arrays
+        The (sub, main, super) diagonals of the tridiagonal 'A' matrix in Ax=b, each of length N.
+        sub[i] = A[i, i - 1] and sup[i] = A[i, i + 1], so sub[0] and sup[N - 1] are unused.
     b : Numpy 1D array
         The 'b' vector in Ax=b
     g : Numpy 1D array
@@ -26,6 +32,8 @@ def psor_solver(A, b, g, guess = None, relax_param = 1, tol = 1e-6, max_iter = 1
         The tolerance level for convergence.
     max_iter : int
         The maximum number of iterations before timing out.
+    ordering : {"lexicographic", "red_black"}, default "lexicographic"
+        The order the elements of x are updated in during a sweep.
 
     Returns
     -------
@@ -33,6 +41,8 @@ def psor_solver(A, b, g, guess = None, relax_param = 1, tol = 1e-6, max_iter = 1
         The solution to Ax = b
     '''
 
+    sub_diag, main_diag, sup_diag = A
+
     N = b.shape[0]
 
     # Set up holders for x
@@ -41,6 +51,9 @@ def psor_solver(A, b, g, guess = None, relax_param = 1, tol = 1e-6, max_iter = 1
     else:
         x_last = guess
 
+    if ordering == "red_black":
+        return red_black_solver(A, b, x_last, relax_param, tol, max_iter, g = g)
+
     x_this = np.zeros(N)
 
     # A loop to control the total number of iterations
@@ -49,19 +62,20 @@ def psor_solver(A, b, g, guess = None, relax_param = 1, tol = 1e-6, max_iter = 1
         # Moving along the x vector
         for i in range(N):
 
-            relax_multiple = relax_param / A[i, i]
+            relax_multiple = relax_param / main_diag[i]
 
             # Set up the 4 pieces needed to calculate x_this[i]
             first  = (1 - relax_param) * x_last[i]
             second = b[i]
 
+            # Only the sub and super diagonal neighbours are non-zero
             third = 0.0
-            for j in range(i):
-                third = third + A[i, j] * x_this[j]
+            if i > 0:
+                third = sub_diag[i] * x_this[i - 1]
 
             fourth = 0.0
-            for j in range(i + 1, N):
-                fourth = fourth + A[i, j] * x_last[j]
+            if i < N - 1:
+                fourth = sup_diag[i] * x_last[i + 1]
 
             x_this[i] = np.maximum(g[i], first + relax_multiple * (second - third - fourth))
 
@@ -1,19 +1,24 @@
 import numpy as np
 from numpy.linalg import norm
 
-def sor_solver(A, b, guess = None, relax_param = 1, tol = 1e-6, max_iter = 100000):
+def sor_solver(A, b, guess = None, relax_param = 1, tol = 1e-6, max_iter = 100000, ordering = "lexicographic"):
     '''
     This solver solves the linear system of Ax=b using SOR.
-    It does so using the iterative approach, and not the matrix approach,
-    so there may be room for speed improvements.
+    It does so using the iterative approach, and not the matrix approach.
+    Only the neighbours of each element are visited, so a sweep is O(N).
 
     The SOR algorithm is a mix of Gauss Siedel with the previous iteration's value,
     weighted by the relaxation parameter.
 
+    With ordering = "red_black", the even (red) elements are updated first and then the
+    odd (black) elements. Elements of the same colour do not depend on each other, so
+    each half sweep is a handful of vectorized Numpy operations.
+
     Parameters
     ----------
-    A : Numpy 2D matrix
-        The 'A' matrix in Ax=b
+    A : tuple of 3 Numpy 1D arrays
+        The (sub, main, super) diagonals of the tridiagonal 'A' matrix in Ax=b, each of length N.
+        sub[i] = A[i, i - 1] and sup[i] = A[i, i + 1], so sub[0] and sup[N - 1] are unused.
     b : Numpy 1D array
         The 'b' vector in Ax=b
     guess: Numpy 1D array
@@ -24,6 +29,8 @@ def sor_solver(A, b, guess = None, relax_param = 1, tol = 1e-6, max_iter = 10000
         The tolerance level for convergence.
     max_iter : int
         The maximum number of iterations before timing out.
+    ordering : {"lexicographic", "red_black"}, default "lexicographic"
+        The order the elements of x are updated in during a sweep.
 
     Returns
     -------
@@ -31,6 +38,8 @@ def sor_solver(A, b, guess = None, relax_param = 1, tol = 1e-6, max_iter = 10000
         The solution to Ax = b
     '''
 
+    sub_diag, main_diag, sup_diag = A
+
     N = b.shape[0]
 
     # Set up holders for x
@@ -39,6 +48,9 @@ def sor_solver(A, b, guess = None, relax_param = 1, tol = 1e-6, max_iter = 10000
     else:
         x_last = guess
 
+    if ordering == "red_black":
+        return red_black_solver(A, b, x_last, relax_param, tol, max_iter)
+
     x_this = np.zeros(N)
 
     # A loop to control the total number of iterations
@@ -47,19 +59,20 @@ def sor_solver(A, b, guess = None, relax_param = 1, tol = 1e-6, max_iter = 10000
         # Moving along the x vector
         for i in range(N):
 
-            relax_multiple = relax_param / A[i, i]
+            relax_multiple = relax_param / main_diag[i]
 
             # Set up the 4 pieces needed to calculate x_this[i]
             first  = (1 - relax_param) * x_last[i]
             second = b[i]
 
+            # Only the sub and super diagonal neighbours are non-zero
             third = 0.0
-            for j in range(i):
-                third = third + A[i, j] * x_this[j]
+            if i > 0:
+                third = sub_diag[i] * x_this[i - 1]
 
             fourth = 0.0
-            for j in range(i + 1, N):
-                fourth = fourth + A[i, j] * x_last[j]
+            if i < N - 1:
+                fourth = sup_diag[i] * x_last[i + 1]
 
             x_this[i] = first + relax_multiple * (second - third - fourth)
 
@@ -71,4 +84,47 @@ def sor_solver(A, b, guess = None, relax_param = 1, tol = 1e-6, max_iter = 10000
             x_last = x_this.copy()
 
     print("Solution did not converge, returning closest solution:")
-    return x_this
\ No newline at end of file
+    return x_this
+
+def red_black_solver(A, b, x_last, relax_param, tol, max_iter, g = None):
+    '''
+    SOR with red-black ordering. When g is supplied, every update is projected
+    onto x >= g, giving PSOR.
+    '''
+
+    sub_diag, main_diag, sup_diag = A
+
+    N = b.shape[0]
+
+    # x is padded with a 0 on either side so that both neighbours of every element can be sliced
+    x_pad = np.zeros(N + 2)
+    x_pad[1:N+1] = x_last
+    x_this = x_pad[1:N+1]
+
+    # A loop to control the total number of iterations
+    for iter in range(max_iter):
+
+        x_last = x_this.copy()
+
+        # Red (even) elements first, then black (odd) elements using the new red values
+        for start in [0, 1]:
+
+            left   = x_pad[start:N:2]
+            centre = x_pad[start + 1:N + 1:2]
+            right  = x_pad[start + 2:N + 2:2]
+
+            gauss_seidel = (b[start::2] - sub_diag[start::2] * left - sup_diag[start::2] * right) / main_diag[start::2]
+
+            x_new = (1 - relax_param) * centre + relax_param * gauss_seidel
+
+            if g is not None:
+                x_new = np.maximum(g[start::2], x_new)
+
+            x_pad[start + 1:N + 1:2] = x_new
+
+        # Exit if we have reached convergence, otherwise continue
+        if(norm(x_this - x_last) <= tol):
+            return x_this.copy()
+
+    print("Solution did not converge, returning closest solution:")
+    return x_this.copy()
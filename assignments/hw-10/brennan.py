@@ -1,4 +1,5 @@
 import numpy as np
+from thomas import thomas_factor, forward_sweep
 
 def brennan_solver(A, b, g):
     '''
@@ -11,62 +12,71 @@ def brennan_solver(A, b, g):
 
     Parameters
     ----------
-    A : Numpy matrix
-        A tridiagonal matrix to solve using the Thomas algorithm
+    A : tuple of 3 Numpy 1D arrays
+        The (sub, main, super) diagonals of a tridiagonal matrix, each of length N.
+        sub[i] = A[i, i - 1] and sup[i] = A[i, i + 1], so sub[0] and sup[N - 1] are unused.
     b : Numpy array
-        The right hand side of Ax = b
-    g : Numpy 1D array
-        The vector to elementwise take the max against at each iteration
+        The right hand side of Ax = b. This can also be a (N, K) array holding K right hand sides as columns,
+        in which case the diagonals of A can be (N, K) as well to solve K different systems at once.
+    g : Numpy array
+        The vector to elementwise take the max against at each iteration, with the same shape as b.
 
     Returns
     -------
     x : Numpy array
-        The solution to the linear system.
+        The solution to the linear system, with the same shape as b.
     '''
 
-    [A_reduced, b_reduced] = forward_step(A.copy(), b.copy())
-
-    x = backward_step(A_reduced, b_reduced, g.copy())
+    x = brennan_factored_solver(thomas_factor(A), b, g)
 
     return x
 
-def forward_step(A, b):
+def brennan_factored_solver(A_factored, b, g):
+    '''
+    Solve the linear system Ax = b using the Brennan algorithm and a factorization of A from thomas.thomas_factor().
 
-    N = b.shape[0]
+    The forward elimination of A is shared with Thomas. The projection against g happens
+    during the back substitution, so it is unaffected by factoring A ahead of time.
 
-    for i in range(1, N): # 1 to N-1
+    Parameters
+    ----------
+    A_factored : tuple of 3 Numpy 1D arrays
+        The (multipliers, reduced main, super) diagonals returned by thomas.thomas_factor().
+    b : Numpy array
+        The right hand side of Ax = b, either (N,) or (N, K).
+    g : Numpy array
+        The vector to elementwise take the max against at each iteration, with the same shape as b.
 
-        alpha_i   = A[i,     i    ]
-        alpha_i_1 = A[i - 1, i - 1]
-        beta_i_1  = A[i - 1, i    ]
-        gamma_i   = A[i,     i - 1]
+    Returns
+    -------
+    x : Numpy array
+        The solution to the linear system, with the same shape as b.
+    '''
 
-        # Alter alpha
-        A[i, i] = alpha_i - beta_i_1 * (gamma_i / alpha_i_1)
+    b_reduced = forward_sweep(A_factored, b.copy())
 
-        # Set gamma to 0
-        A[i, i-1] = 0
+    x = backward_step(A_factored, b_reduced, g.copy())
 
-        # Alter b
-        b[i] = b[i] - b[i-1] * (gamma_i / alpha_i_1)
+    return x
 
-    return A, b
+def backward_step(A_factored, b_reduced, g):
 
-def backward_step(A_reduced, b_reduced, g):
+    main_reduced = A_factored[1]
+    sup_diag     = A_factored[2]
 
     N = b_reduced.shape[0]
-    x = np.zeros(N)
+    x = np.zeros(b_reduced.shape)
 
     # Set the last value of x, known
-    x[N-1] = np.maximum(g[N-1], b_reduced[N-1] / A_reduced[N-1, N-1])
+    x[N-1] = np.maximum(g[N-1], b_reduced[N-1] / main_reduced[N-1])
 
     for i in reversed(range(N-1)): # N-2 to 0
 
         b_i     = b_reduced[i]
-        beta_i  = A_reduced[i, i + 1]
-        alpha_i = A_reduced[i, i]
+        beta_i  = sup_diag[i]
+        alpha_i = main_reduced[i]
 
         # Iterate x
         x[i] = np.maximum(g[i], (b_i - beta_i * x[i + 1]) / alpha_i)
 
-    return x
\ No newline at end of file
+    return x
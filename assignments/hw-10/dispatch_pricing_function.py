@@ -1,7 +1,9 @@
 import numpy as np
 from pricing_function_closed_form import pricing_function_closed_form
-from pricing_function_fdm import pricing_function_fdm
+from pricing_function_fdm import pricing_function_fdm, pricing_function_fdm_batch
 from pricing_function_monte_carlo import pricing_function_monte_carlo
+from pricing_function_multilevel_monte_carlo import pricing_function_multilevel_monte_carlo
+from pricing_function_american_approximation import pricing_function_american_approximation
 
 def dispatch_pricing_function(method, solver, option_type, call_put):
     '''Dispatch to get the correct pricing function based on the user's inputs
@@ -15,17 +17,35 @@ def dispatch_pricing_function(method, solver, option_type, call_put):
 
     # Return the pricing function
     if method == "monte_carlo":
-        pricing_function = pricing_function_monte_carlo(option_type, option_price_at_T)
+        pricing_function = pricing_function_monte_carlo(option_type, call_put, option_price_at_T)
+
+    elif method == "multilevel_monte_carlo":
+        pricing_function = pricing_function_multilevel_monte_carlo(option_type, call_put, option_price_at_T)
 
     elif method == "closed_form":
         # Always a European option
         pricing_function = pricing_function_closed_form(call_put)
 
+    elif method == "american_approx":
+        # Always an American option
+        pricing_function = pricing_function_american_approximation(call_put)
+
     elif method in ["crank_nicholson", "implicit_fdm", "explicit_fdm"]:
         pricing_function = pricing_function_fdm(method, solver, option_type, call_put)
 
     return pricing_function
 
+def dispatch_batch_pricing_function(method, solver, option_type):
+    '''Dispatch to get a pricing function that prices a whole batch of options at once
+
+    Returns None when the method/solver combination has no batch pricing function.
+    '''
+
+    if method in ["crank_nicholson", "implicit_fdm", "explicit_fdm"] and solver != "iterative":
+        return pricing_function_fdm_batch(method, option_type)
+
+    return None
+
 # ----------------------------------------------------------------------------------------------------------------------
 # Option price at T for call/put
 
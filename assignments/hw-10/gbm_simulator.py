@@ -1,11 +1,15 @@
 import numpy as np
 import sys
+import warnings
+from scipy.stats import qmc
+from scipy.special import ndtri
 
-def simulate_gbm(n, s, r, div_yield, t, t_terminal, dt, sigma, method = "euler", seed = None):
+def simulate_gbm(n, s, r, div_yield, t, t_terminal, dt, sigma, method = "euler", seed = None, time_grid = None,
+                 variance_reduction = None, sampling = "pseudo", rng = None, layout = "path_major", out = None):
     """Simulate a geometric brownian motion path
 
-    The GBM is simulated using either the Euler or Milstein method. Instead of a loop, the algorithms have been
-    vectorized for speed.
+    The GBM is simulated using either the Euler or Milstein method, or sampled exactly from its log-normal
+    distribution. Instead of a loop, the algorithms have been vectorized for speed.
 
     Euler:
 
@@ -15,6 +19,18 @@ def simulate_gbm(n, s, r, div_yield, t, t_terminal, dt, sigma, method = "euler",
 
     :math:`S_{t+1} = S_{t} + \mu S_{t} dt + \sigma S_{t} \sqrt{dt} Z_{t+1} + .5 \sigma ^ 2 ((\sqrt{dt} Z_{t+1}) ^ 2 - dt)`
 
+    Exact:
+
+    :math:`S_{t+1} = S_{t} \exp((\mu - .5 \sigma ^ 2) dt + \sigma \sqrt{dt} Z_{t+1})`
+
+    The exact method has no discretization bias, so it only needs to step between the dates the payoff depends on.
+    Those can be given as a (possibly non-uniform) `time_grid`.
+
+    With layout = "time_major", the result is the transposed (t_total + 1) x n matrix, so each time step is contiguous
+    in memory. It is filled one time step at a time, drawing the normals of each step as they are needed, so the
+    normals come from the random stream in a different order and the paths differ from the path major ones with the
+    same seed. Sobol points are still drawn for whole paths and then transposed.
+
     Parameters
     ----------
     n : double
@@ -33,15 +49,29 @@ def simulate_gbm(n, s, r, div_yield, t, t_terminal, dt, sigma, method = "euler",
         Discretization time step size
     sigma : double
         Volatility
-    method : {"euler", "milstein"}, defaults "euler"
+    method : {"euler", "milstein", "exact"}, defaults "euler"
         Numerical method to simulate with
     seed : int
         Random seed to set for random normal generation
+    time_grid : Numpy 1D array, defaults None
+        Increasing simulation times from t to t_terminal, which override dt. The columns of the result are
+        the prices at these times.
+    variance_reduction : {None, "antithetic", "moment_matching"}, defaults None
+        How the normals are drawn, see :py:func:`draw_normals`.
+    sampling : {"pseudo", "sobol"}, defaults "pseudo"
+        The source of the normals, see :py:func:`normal_sampler`.
+    rng : numpy.random.Generator, defaults None
+        A generator to draw the normals from. When None, the global Numpy random state is used.
+    layout : {"path_major", "time_major"}, defaults "path_major"
+        Whether the paths are the rows or the columns of the result.
+    out : Numpy 2D array, defaults None
+        A (t_total + 1) x n array, such as a numpy.memmap, to write a time major simulation into.
 
     Returns
     ----------
     sims : Numpy array
-        An array containing the n simulations as rows and the time steps as columns
+        An array containing the n simulations as rows and the time steps as columns, or the transpose of that
+        for layout = "time_major".
 
     See also
     ----------
@@ -53,11 +83,18 @@ def simulate_gbm(n, s, r, div_yield, t, t_terminal, dt, sigma, method = "euler",
     if seed is not None:
         np.random.seed(seed)
 
-    # Total time steps
-    t_total = int((t_terminal - t) / dt)
+    # Total time steps, and the size of each one
+    t_total, dt = get_time_steps(t, t_terminal, dt, time_grid)
+
+    if layout == "time_major":
+        return simulate_gbm_time_major(n, s, r, div_yield, dt, sigma, t_total, method, variance_reduction, sampling, rng,
+                                       out)
+
+    elif layout != "path_major":
+        sys.exit("Invalid layout. Valid layouts are: path_major, time_major")
 
     # Random normal generation
-    z = np.random.randn(n, t_total)
+    z = draw_normals(n, normal_sampler(t_total, dt, sampling, rng), variance_reduction)
 
     # Fill in the simulation matrix
     s_t = dispatch_simulation(n, s, r, div_yield, dt, sigma, z, method)
@@ -65,6 +102,396 @@ def simulate_gbm(n, s, r, div_yield, t, t_terminal, dt, sigma, method = "euler",
     return s_t
 
 
+def simulate_gbm_terminal(n, s, r, div_yield, t, t_terminal, dt, sigma, method = "euler", seed = None, statistics = None,
+                          chunk_size = None, time_grid = None, variance_reduction = None, sampling = "pseudo",
+                          rng = None):
+    """Simulate only the terminal values of geometric brownian motion paths
+
+    The paths are the same as those of :py:func:`simulate_gbm` with the same seed, but the full n x (t_total + 1)
+    path matrix is never materialized. Paths are simulated in chunks of `chunk_size` rows, and only the terminal
+    values (and any requested running statistics) of each path are kept, so the result is O(n).
+
+    Parameters
+    ----------
+    n : double
+        The number of paths to simulate
+    s : double
+        Initial stock price at time t.
+    r : double
+        The risk free interest rate.
+    div_yield : double
+        Dividend yield.
+    t_terminal : double
+        Terminal time T
+    t : double
+        Starting time
+    dt : double
+        Discretization time step size
+    sigma : double
+        Volatility
+    method : {"euler", "milstein", "exact"}, defaults "euler"
+        Numerical method to simulate with
+    seed : int
+        Random seed to set for random normal generation
+    statistics : list of {"mean", "max", "min", "exact_terminal"}, defaults None
+        Running statistics to track along each path, including the initial price. "exact_terminal" is the terminal
+        value of the exact log-normal solution driven by the same normals, which is useful as a control variate.
+    chunk_size : int, defaults None
+        The number of paths simulated at once. By default this holds about 1 million time steps in memory.
+    time_grid : Numpy 1D array, defaults None
+        Increasing simulation times from t to t_terminal, which override dt.
+    variance_reduction : {None, "antithetic", "moment_matching"}, defaults None
+        How the normals are drawn, see :py:func:`draw_normals`. This is applied to each chunk of paths.
+    sampling : {"pseudo", "sobol"}, defaults "pseudo"
+        The source of the normals, see :py:func:`normal_sampler`.
+    rng : numpy.random.Generator, defaults None
+        A generator to draw the normals from. When None, the global Numpy random state is used.
+
+    Returns
+    ----------
+    s_T : Numpy array or dict
+        A length n array of the terminal values. If statistics are requested, a dict holding
+        "terminal" and each requested statistic as length n arrays.
+
+    See also
+    ----------
+    simulate_gbm
+
+    """
+
+    # Set the seed
+    if seed is not None:
+        np.random.seed(seed)
+
+    # Total time steps, and the size of each one
+    t_total, dt = get_time_steps(t, t_terminal, dt, time_grid)
+
+    if chunk_size is None:
+        chunk_size = max(1, 1000000 // max(t_total, 1))
+
+    # Antithetic pairs must not be split across chunks
+    if variance_reduction == "antithetic":
+        chunk_size = chunk_size + chunk_size % 2
+
+    if statistics is None:
+        statistics = []
+
+    sampler = normal_sampler(t_total, dt, sampling, rng)
+
+    valid_statistics = ["mean", "max", "min", "exact_terminal"]
+    if any(statistic not in valid_statistics for statistic in statistics):
+        sys.exit("Invalid statistic. Valid statistics are: " + ', '.join(valid_statistics))
+
+    results = {name: np.empty(n) for name in ["terminal"] + list(statistics)}
+
+    for start in range(0, n, chunk_size):
+
+        stop = min(start + chunk_size, n)
+
+        # Whole rows are drawn so the random stream matches simulate_gbm
+        z = draw_normals(stop - start, sampler, variance_reduction)
+
+        # Must be calculated before z is overwritten below
+        if "exact_terminal" in statistics:
+            results["exact_terminal"][start:stop] = s * np.exp(np.sum(
+                (r - div_yield - .5 * sigma * sigma) * dt + sigma * np.sqrt(dt) * z, axis = 1))
+
+        # The cumulative product of the step factors is done in place
+        s_t = np.cumprod(dispatch_step_factors(r, div_yield, dt, sigma, z, method), axis = 1, out = z)
+        s_t *= s
+
+        results["terminal"][start:stop] = s_t[:, -1]
+
+        if "mean" in statistics:
+            results["mean"][start:stop] = (s + np.sum(s_t, axis = 1)) / (t_total + 1)
+
+        if "max" in statistics:
+            results["max"][start:stop] = np.maximum(s, np.max(s_t, axis = 1))
+
+        if "min" in statistics:
+            results["min"][start:stop] = np.minimum(s, np.min(s_t, axis = 1))
+
+    if len(statistics) == 0:
+        return results["terminal"]
+
+    return results
+
+
+def simulate_gbm_time_major(n, s, r, div_yield, dt, sigma, t_total, method, variance_reduction, sampling, rng, out):
+    '''GBM simulation into a (t_total + 1) x n time major array, one time step at a time'''
+
+    if out is None:
+        out = np.empty([t_total + 1, n])
+
+    if out.shape != (t_total + 1, n):
+        sys.exit("out must have shape (t_total + 1, n) for a time major simulation.")
+
+    step_sizes = np.broadcast_to(dt, (t_total,))
+
+    # A Sobol point is a whole path, so its normals can only be drawn all at once
+    if sampling == "sobol":
+        z = draw_normals(n, normal_sampler(t_total, dt, sampling, rng), variance_reduction).T
+    else:
+        step_sampler = normal_sampler(1, dt, sampling, rng)
+
+    out[0] = s
+
+    for j in range(t_total):
+
+        if sampling == "sobol":
+            z_j = z[j]
+        else:
+            z_j = draw_normals(n, step_sampler, variance_reduction)[:, 0]
+
+        out[j + 1] = out[j] * dispatch_step_factors(r, div_yield, step_sizes[j], sigma, z_j, method)
+
+    return out
+
+
+def simulate_gbm_backward(n, s, r, div_yield, t, t_terminal, dt, sigma, seed = None, variance_reduction = None,
+                          rng = None):
+    """Simulate exact geometric brownian motion paths backward in time with a Brownian bridge
+
+    The Brownian motion W is first drawn at the terminal time T. Going backward, W at the previous time step u is
+    drawn from the Brownian bridge between W(0) = 0 and W at the following step v:
+
+    :math:`W_u = \\frac{u}{v} W_v + \\sqrt{\\frac{u (v - u)}{v}} Z`
+
+    Only the current time step is held in memory. This is a generator, so the prices are produced lazily, one
+    time step at a time.
+
+    Parameters
+    ----------
+    n : double
+        The number of paths to simulate
+    s : double
+        Initial stock price at time t.
+    r : double
+        The risk free interest rate.
+    div_yield : double
+        Dividend yield.
+    t_terminal : double
+        Terminal time T
+    t : double
+        Starting time
+    dt : double
+        Discretization time step size
+    sigma : double
+        Volatility
+    seed : int
+        Random seed to set for random normal generation
+    variance_reduction : {None, "antithetic", "moment_matching"}, defaults None
+        How the normals of each time step are drawn, see :py:func:`draw_normals`.
+    rng : numpy.random.Generator, defaults None
+        A generator to draw the normals from. When None, the global Numpy random state is used.
+
+    Yields
+    ----------
+    s_i : Numpy array
+        The n prices at T, then at each earlier time step, down to the initial prices at t.
+
+    See also
+    ----------
+    simulate_gbm
+
+    """
+
+    # Set the seed
+    if seed is not None:
+        np.random.seed(seed)
+
+    t_total, dt = get_time_steps(t, t_terminal, dt, None)
+
+    step_sampler = normal_sampler(1, dt, "pseudo", rng)
+    drift = r - div_yield - .5 * sigma * sigma
+    times = np.arange(t_total + 1) * dt
+
+    w = np.sqrt(times[-1]) * draw_normals(n, step_sampler, variance_reduction)[:, 0]
+
+    yield s * np.exp(drift * times[-1] + sigma * w)
+
+    for i in range(t_total - 1, -1, -1):
+
+        bridge_mean = times[i] / times[i + 1] * w
+        bridge_std  = np.sqrt(times[i] * (times[i + 1] - times[i]) / times[i + 1])
+
+        w = bridge_mean + bridge_std * draw_normals(n, step_sampler, variance_reduction)[:, 0]
+
+        yield s * np.exp(drift * times[i] + sigma * w)
+
+
+def draw_normals(n, sampler, variance_reduction = None):
+    '''Draw the n x t_total standard normals that drive a simulation
+
+    sampler is a function from :py:func:`normal_sampler` that draws a given number of rows of normals.
+
+    "antithetic" draws n / 2 rows and interleaves each with its negative, so rows 2j and 2j + 1 are a pair.
+    "moment_matching" shifts and scales each column so that its sample mean is 0 and its standard deviation is 1.
+    '''
+
+    if variance_reduction is None:
+
+        z = sampler(n)
+
+    elif variance_reduction == "antithetic":
+
+        if n % 2 != 0:
+            sys.exit("An even number of paths is required for antithetic sampling.")
+
+        z_half = sampler(n // 2)
+
+        z = np.empty([n, z_half.shape[1]])
+        z[0::2] = z_half
+        z[1::2] = -z_half
+
+    elif variance_reduction == "moment_matching":
+
+        z = sampler(n)
+        z = (z - np.mean(z, axis = 0)) / np.std(z, axis = 0)
+
+    else:
+
+        sys.exit("Variance reduction not supported.")
+
+    return z
+
+
+def normal_sampler(t_total, dt, sampling = "pseudo", rng = None):
+    '''Retrieve a function that draws rows of t_total standard normals, one per time step
+
+    "pseudo" draws from rng, or the global Numpy random state if rng is None.
+
+    "sobol" uses a scrambled Sobol sequence, seeded from the same source. Successive calls continue
+    along the same sequence. The points are mapped through the inverse normal CDF and then used to build each path's
+    Brownian motion by a Brownian bridge, so the first dimensions (the terminal value, then the midpoint, ...) carry
+    most of the variance. The returned normals are the standardized increments of that Brownian motion.
+    '''
+
+    if sampling == "pseudo" and rng is None:
+
+        def sampler(rows):
+            return np.random.randn(rows, t_total)
+
+    elif sampling == "pseudo":
+
+        def sampler(rows):
+            return rng.standard_normal((rows, t_total))
+
+    elif sampling == "sobol":
+
+        step_sizes = np.broadcast_to(dt, (t_total,))
+        times = np.cumsum(step_sizes)
+
+        if rng is None:
+            sobol_seed = np.random.randint(0, 2 ** 31 - 1)
+        else:
+            sobol_seed = rng.integers(0, 2 ** 31 - 1)
+
+        engine = qmc.Sobol(d = t_total, scramble = True, seed = sobol_seed)
+
+        def sampler(rows):
+
+            # Sobol points are only balanced for powers of 2, but any number of rows is allowed
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                u = engine.random(rows)
+
+            xi = ndtri(np.clip(u, 1e-16, 1 - 1e-16))
+
+            w = brownian_bridge(xi, times)
+
+            # Standardized Brownian increments
+            return np.diff(w, axis = 1, prepend = 0) / np.sqrt(step_sizes)
+
+    else:
+
+        sys.exit("Sampling not supported. Valid values are: pseudo, sobol")
+
+    return sampler
+
+
+def brownian_bridge(xi, times):
+    '''Build Brownian motion paths at the given times from independent standard normals xi by a Brownian bridge
+
+    Column 0 of xi sets the terminal value, and the following columns fill in the midpoints of ever smaller intervals.
+    '''
+
+    n, m = xi.shape
+    w = np.empty([n, m])
+
+    # The terminal value
+    w[:, m - 1] = np.sqrt(times[m - 1]) * xi[:, 0]
+
+    # Breadth first bisection of the intervals between known points. Index -1 is time 0, where w = 0.
+    intervals = [(-1, m - 1)]
+    column = 1
+
+    while len(intervals) > 0:
+
+        next_intervals = []
+
+        for left, right in intervals:
+
+            if right - left < 2:
+                continue
+
+            middle = (left + right) // 2
+
+            t_left = 0.0 if left == -1 else times[left]
+            w_left = 0.0 if left == -1 else w[:, left]
+            t_middle = times[middle]
+            t_right = times[right]
+
+            mean = ((t_right - t_middle) * w_left + (t_middle - t_left) * w[:, right]) / (t_right - t_left)
+            std  = np.sqrt((t_middle - t_left) * (t_right - t_middle) / (t_right - t_left))
+
+            w[:, middle] = mean + std * xi[:, column]
+            column = column + 1
+
+            next_intervals += [(left, middle), (middle, right)]
+
+        intervals = next_intervals
+
+    return w
+
+
+def get_time_steps(t, t_terminal, dt, time_grid):
+    '''The number of time steps, and their size. dt is an array of step sizes when a time_grid is given'''
+
+    if time_grid is None:
+        return int((t_terminal - t) / dt), dt
+
+    time_grid = np.asarray(time_grid, dtype = float)
+
+    if time_grid[0] != t or time_grid[-1] != t_terminal or np.any(np.diff(time_grid) <= 0):
+        sys.exit("time_grid must be increasing, starting at t and ending at t_terminal.")
+
+    return time_grid.shape[0] - 1, np.diff(time_grid)
+
+
+def dispatch_step_factors(r, div_yield, dt, sigma, z, method):
+    '''The factors S_(t+1) / S_t of one time step, for the Euler, Milstein or exact method'''
+
+    if method == "euler":
+
+        factors = 1 + (r - div_yield) * dt + sigma * np.sqrt(dt) * z
+
+    elif method == "milstein":
+
+        factors = 1 + (r - div_yield) * dt + sigma * np.sqrt(dt) * z \
+                  + .5 * sigma * sigma * ((np.sqrt(dt) * z) ** 2 - dt)
+
+    elif method == "exact":
+
+        factors = np.exp((r - div_yield - .5 * sigma * sigma) * dt + sigma * np.sqrt(dt) * z)
+
+    else:
+
+        sys.exit("Method not supported.")
+
+    return factors
+
+
 def dispatch_simulation(n, s, r, div_yield, dt, sigma, z, method):
     '''Dispatch the simulation to the appropriate algorithm'''
 
@@ -76,6 +503,10 @@ def dispatch_simulation(n, s, r, div_yield, dt, sigma, z, method):
 
         s_t = simulate_gbm_milstein(n, s, r, div_yield, dt, sigma, z)
 
+    elif method == "exact":
+
+        s_t = simulate_gbm_exact(n, s, r, div_yield, dt, sigma, z)
+
     else:
 
         sys.exit("Method not supported.")
@@ -107,4 +538,17 @@ def simulate_gbm_milstein(n, s, r, div_yield, dt, sigma, z):
 
     s_t = s * cumprod_z
 
-    return s_t
\ No newline at end of file
+    return s_t
+
+
+def simulate_gbm_exact(n, s, r, div_yield, dt, sigma, z):
+    '''GBM simulation by exact sampling of the log-normal increments. dt can be an array of step sizes'''
+
+    cumsum_log_z = np.cumsum((r - div_yield - .5 * sigma * sigma) * dt + sigma * np.sqrt(dt) * z,
+                             axis = 1)
+
+    cumsum_log_z = np.column_stack((np.zeros([n, 1]), cumsum_log_z))
+
+    s_t = s * np.exp(cumsum_log_z)
+
+    return s_t
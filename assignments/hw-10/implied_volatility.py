@@ -0,0 +1,139 @@
+import numpy as np
+from collections import namedtuple
+from scipy.special import ndtr
+from pricing_function_closed_form import d_1_d_2
+
+# Returned by implied_volatility(). Each field has the broadcast shape of the quotes
+ImpliedVolatility = namedtuple("ImpliedVolatility", ["sigma", "converged", "iterations"])
+
+def implied_volatility(price, s, k, r, div_yield, t_terminal, t, call_put = "call", tol = 1e-10, max_iter = 100,
+                       sigma_min = 1e-4, sigma_max = 5.0):
+    '''Invert the Black Scholes closed form for the volatility of a whole chain of European quotes at once
+
+    By put-call parity, every quote is solved as the out of the money option with the same strike, whose price is
+    all time value and so most sensitive to the volatility. Each quote starts from the rational approximation of
+    Corrado and Miller, and all quotes are then iterated together with Halley steps, using the analytic vega
+    and its derivative in sigma (volga). Every quote keeps a bracket [low, high] on its volatility, which is
+    updated after each step, and a step that leaves the bracket is replaced by bisection. Quotes drop out of
+    the iteration as they converge.
+
+    Parameters
+    ----------
+    price : Numpy array or double
+        The quoted option prices.
+    s : Numpy array or double
+        The stock prices at time t.
+    k : Numpy array or double
+        The strike prices.
+    r : Numpy array or double
+        The risk free interest rates.
+    div_yield : Numpy array or double
+        The dividend yields.
+    t_terminal : Numpy array or double
+        The terminal times.
+    t : Numpy array or double
+        The initial times.
+    call_put : string or Numpy array of strings
+        Either "call" or "put", for all quotes or per quote.
+    tol : double
+        The quotes have converged once the model price of the out of the money option is within a relative
+        tolerance tol of its quoted price.
+    max_iter : int
+        The maximum number of iterations.
+    sigma_min, sigma_max : double
+        The volatilities are searched for in [sigma_min, sigma_max].
+
+    Returns
+    -------
+    result : named tuple
+        An ImpliedVolatility tuple of the volatilities, the convergence flags, and the number of iterations each
+        quote took. Quotes outside the no arbitrage bounds get a volatility of NaN and are not converged.
+    '''
+
+    price, s, k, r, div_yield, t_terminal, t, call_put = np.broadcast_arrays(price, s, k, r, div_yield, t_terminal,
+                                                                             t, call_put)
+    shape = price.shape
+
+    price, s, k, r, div_yield, t_terminal, t = [np.array(x, dtype = float).ravel()
+                                                for x in [price, s, k, r, div_yield, t_terminal, t]]
+    is_call = call_put.ravel() == "call"
+
+    tau = t_terminal - t
+    s_discounted = s * np.exp(-1 * div_yield * tau)
+    k_discounted = k * np.exp(-1 * r * tau)
+
+    # The equivalent call price by put-call parity, and the price of the out of the money option
+    call_price = np.where(is_call, price, price + s_discounted - k_discounted)
+    otm_call = k_discounted >= s_discounted
+    otm_price = np.where(otm_call, call_price, call_price - s_discounted + k_discounted)
+
+    sigma = np.full(price.shape, np.nan)
+    converged = np.zeros(price.shape, dtype = bool)
+    iterations = np.zeros(price.shape, dtype = int)
+
+    # The call price must lie strictly between its intrinsic value and the discounted stock price
+    valid = (call_price > np.maximum(s_discounted - k_discounted, 0)) & (call_price < s_discounted) & (tau > 0)
+
+    sigma[valid] = np.clip(initial_guess(call_price, s_discounted, k_discounted, tau)[valid], sigma_min, sigma_max)
+    low = np.full(price.shape, sigma_min)
+    high = np.full(price.shape, sigma_max)
+
+    active = np.flatnonzero(valid)
+
+    for iteration in range(max_iter):
+
+        if active.shape[0] == 0:
+            break
+
+        sigma_a = sigma[active]
+        tau_a = tau[active]
+        sqrt_tau = np.sqrt(tau_a)
+
+        d_1_value, d_2_value = d_1_d_2(s[active], k[active], r[active], div_yield[active], t_terminal[active],
+                                       t[active], sigma_a)
+
+        # Price error of the out of the money option (equal to that of the call), vega and volga
+        sign = np.where(otm_call[active], 1, -1)
+        error = sign * (s_discounted[active] * ndtr(sign * d_1_value) - k_discounted[active] * ndtr(sign * d_2_value)) \
+                - otm_price[active]
+        vega = s_discounted[active] * np.exp(-0.5 * d_1_value**2) / np.sqrt(2 * np.pi) * sqrt_tau
+        volga = vega * d_1_value * d_2_value / sigma_a
+
+        iterations[active] = iteration + 1
+
+        done = np.abs(error) <= tol * otm_price[active]
+        converged[active[done]] = True
+
+        # The price increases with sigma, so the sign of the error tightens the bracket
+        low[active] = np.where(error < 0, sigma_a, low[active])
+        high[active] = np.where(error > 0, sigma_a, high[active])
+
+        # Halley step, falling back to bisection when it leaves the bracket
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            step = 2 * error * vega / (2 * vega**2 - error * volga)
+
+        sigma_new = sigma_a - step
+        bisect = ~np.isfinite(sigma_new) | (sigma_new <= low[active]) | (sigma_new >= high[active])
+        sigma_new = np.where(bisect, 0.5 * (low[active] + high[active]), sigma_new)
+
+        sigma[active] = np.where(done, sigma_a, sigma_new)
+
+        # Quotes whose bracket has collapsed cannot get closer, so they also count as converged
+        collapsed = (high[active] - low[active]) <= 1e-15 * high[active]
+        converged[active[collapsed]] = True
+
+        active = active[~(done | collapsed)]
+
+    return ImpliedVolatility(sigma.reshape(shape), converged.reshape(shape), iterations.reshape(shape))
+
+
+def initial_guess(call_price, s_discounted, k_discounted, tau):
+    '''The Corrado and Miller rational approximation of the implied volatility of a call
+    '''
+
+    half_moneyness = 0.5 * (s_discounted - k_discounted)
+    excess = call_price - half_moneyness
+
+    root = np.sqrt(np.maximum(excess**2 - (s_discounted - k_discounted)**2 / np.pi, 0))
+
+    return np.sqrt(2 * np.pi / tau) / (s_discounted + k_discounted) * (excess + root)
@@ -35,7 +35,9 @@ user to achieve higher levels of precision
 - Brennan
 - Finite difference methods
 - Monte Carlo simulation
+- Multilevel Monte Carlo
 - Black scholes exact solutions
+- Barone-Adesi Whaley and Bjerksund Stensland American approximations
 
 ### Included files
 
@@ -55,15 +57,23 @@ user to achieve higher levels of precision
 
 `gbm_simulator.py` - Simulate stock prices using geometric brownian motion
 
+`implied_volatility.py` - Inverts the Black Scholes closed form for the implied volatilities of a chain of quotes.
+
 `price_option.py` - Main interface function that does the validation and hands off to the dispatcher
 
 `pricing_function_closed_form.py` - Solves the Black Scholes European closed form option price.
 
+`pricing_function_american_approximation.py` - Barone-Adesi Whaley and Bjerksund Stensland approximations of
+American option prices.
+
 `pricing_function_fdm.py` - Returns a solving function that implements the chosen FDM method/solver combination.
 
 `pricing_function_monte_carlo.py` - Performs monte carlo simulation and discounts the prices back to time 0 to
 get an option price.
 
+`pricing_function_multilevel_monte_carlo.py` - Multilevel Monte Carlo over a hierarchy of Euler / Milstein time steps,
+for European options.
+
 `solvers.py` - Handles the solver lookup operation
 
 ### How to run
@@ -88,8 +98,8 @@ European option prices:
 0               Closed Form $23.727169 $22.742053   $0.000000  $0.000000
 1               Monte Carlo $27.191132 $22.263111   $3.463963 $-0.478942
 2                  Explicit $23.686678 $22.701779  $-0.040491 $-0.040274
-3     SOR - Crank Nicholson $23.708316 $22.723106  $-0.018853 $-0.018947
-4            SOR - Implicit $23.690751 $22.705237  $-0.036418 $-0.036816
+3     SOR - Crank Nicholson $23.708336 $22.723110  $-0.018833 $-0.018943
+4            SOR - Implicit $23.690777 $22.705258  $-0.036392 $-0.036795
 5  Thomas - Crank Nicholson $23.708322 $22.723110  $-0.018847 $-0.018943
 6         Thomas - Implicit $23.690786 $22.705261  $-0.036383 $-0.036792
 
@@ -98,8 +108,8 @@ American option prices:
                       Method       Call        Put
 0                Monte Carlo $28.821161 $22.908044
 1                   Explicit $23.698560 $22.841751
-2     PSOR - Crank Nicholson $23.719982 $22.854661
-3            PSOR - Implicit $23.702019 $22.832963
+2     PSOR - Crank Nicholson $23.720110 $22.854751
+3            PSOR - Implicit $23.702493 $22.833318
 4  Brennan - Crank Nicholson $23.720096 $22.853696
 5         Brennan - Implicit $23.702505 $22.831401
 
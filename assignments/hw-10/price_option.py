@@ -1,6 +1,9 @@
 import sys
-from dispatch_pricing_function import dispatch_pricing_function
+from dispatch_pricing_function import dispatch_pricing_function, dispatch_batch_pricing_function
+from pricing_function_monte_carlo import price_monte_carlo_chain
+from pricing_function_closed_form import closed_form_greeks, pricing_function_closed_form_scalar
 import numpy as np
+import pandas as pd
 
 
 def price_option(s, k, r, div_yield, sigma, t_terminal, t, method, option_type = "european", call_put = "call", solver = None, options = None):
@@ -9,7 +12,8 @@ def price_option(s, k, r, div_yield, sigma, t_terminal, t, method, option_type =
     Parameters
     ----------
     s : double
-        The initial price of the asset.
+        The initial price of the asset. The FDM methods also accept an array of prices, which are all valued from
+        a single solve.
     k : double
         The stike price for the option.
     r : double
@@ -23,7 +27,8 @@ def price_option(s, k, r, div_yield, sigma, t_terminal, t, method, option_type =
     sigma : double
         The volatility of the stock.
     method : string
-        One of: "crank_nicholson", "monte_carlo", "explicit_fdm", "implicit_fdm", "closed_form". Used to price the option.
+        One of: "crank_nicholson", "monte_carlo", "multilevel_monte_carlo", "explicit_fdm", "implicit_fdm", "closed_form",
+        "american_approx". Used to price the option.
     option_type : string
         Either: "european" or "american"
     call_put : string
@@ -31,7 +36,7 @@ def price_option(s, k, r, div_yield, sigma, t_terminal, t, method, option_type =
     solver : string
         Either: "direct" or "iterative". This uses either Thomas / Brennan for direct, and SOR / PSOR for iterative
     options : dict
-        A named dict containing overrides for various method specific parameters. Use get_option_defaults(method, solver)
+        A named dict containing overrides for various method specific parameters. Use get_option_defaults(method, solver, option_type)
         to see the options for a specfic method/solver combination.
 
 
@@ -47,7 +52,7 @@ def price_option(s, k, r, div_yield, sigma, t_terminal, t, method, option_type =
     validate_method_solver_combination(method, solver, option_type)
 
     # Set option defaults and update to user defined options
-    option_values = replace_options(options, get_option_defaults(method, solver))
+    option_values = replace_options(options, get_option_defaults(method, solver, option_type))
 
     pricing_function = dispatch_pricing_function(method, solver, option_type, call_put)
 
@@ -57,31 +62,300 @@ def price_option(s, k, r, div_yield, sigma, t_terminal, t, method, option_type =
 
     print(option_values)
 
+
+def make_pricer(method, solver = None, option_type = "european", call_put = "call", options = None):
+    '''Build a pricer for repeated quotes, with the validation, options and dispatch all done up front
+
+    The arguments are the same as for price_option. The options are resolved once, so a Monte Carlo pricer reuses
+    the same seed for every quote unless one is given. Closed form pricers quote scalars with a math module kernel,
+    and fall back to the vectorized Numpy version for arrays. FDM pricers keep the strike independent solution
+    cache of pricing_function_fdm(), so repeated quotes for the same r, div_yield, sigma and t_terminal only
+    rescale and interpolate.
+
+    Returns
+    -------
+    pricer : function
+        pricer(s, k, r, div_yield, sigma, t_terminal, t) returns the same price as price_option.
+    '''
+
+    # Validation
+    validate_option_type(option_type)
+    validate_call_put(call_put)
+    validate_method_solver_combination(method, solver, option_type)
+
+    # Set option defaults and update to user defined options
+    option_values = replace_options(options, get_option_defaults(method, solver, option_type))
+
+    pricing_function = dispatch_pricing_function(method, solver, option_type, call_put)
+
+    if method == "closed_form" and option_values["out"] is None:
+
+        scalar_pricing_function = pricing_function_closed_form_scalar(call_put)
+
+        scalar = (float, int)
+
+        def pricer(s, k, r, div_yield, sigma, t_terminal, t):
+            # Only Python and Numpy floats and ints take the math module path, so arrays of any size keep their shape
+            if isinstance(s, scalar) and isinstance(k, scalar) and isinstance(r, scalar) \
+                    and isinstance(div_yield, scalar) and isinstance(sigma, scalar) \
+                    and isinstance(t_terminal, scalar) and isinstance(t, scalar):
+                return scalar_pricing_function(s, k, r, div_yield, sigma, t_terminal, t)
+            return pricing_function(s, k, r, div_yield, sigma, t_terminal, t)
+
+        return pricer
+
+    def pricer(s, k, r, div_yield, sigma, t_terminal, t):
+        return pricing_function(s, k, r, div_yield, sigma, t_terminal, t, **option_values)
+
+    return pricer
+
+
+def price_options(contracts, options = None):
+    '''Price a whole book of American or European options in one call
+
+    Contracts are grouped by (method, solver, option_type, call_put). Each group is validated once, gets its
+    option defaults once, and has its pricing function dispatched once. Closed form and american_approx groups are
+    then priced in a single vectorized call, and FDM groups with a direct solver are priced in batches that share
+    one time loop. The other methods reuse the group's pricing function row by row.
+
+    Parameters
+    ----------
+    contracts : pandas DataFrame or dict
+        One row per contract. Required columns are: "s", "k", "r", "div_yield", "sigma", "t_terminal", "t" and
+        "method". The optional columns "option_type" (default "european"), "call_put" (default "call") and
+        "solver" (default None) take the same values as in price_option.
+    options : dict
+        A named dict containing overrides for various method specific parameters. Each group only takes the
+        overrides that its method/solver combination uses, so a mixed book can share one dict. Overrides that no
+        group uses are reported once. Use get_option_defaults(method, solver, option_type) to see the options for
+        a specfic method/solver combination.
+
+    Returns
+    -------
+    prices : Numpy 1D array
+        The option prices, in the same order as the rows of contracts.
+    '''
+
+    # Group indices are used as positions, so the index must be 0, ..., n - 1
+    contracts = pd.DataFrame(contracts).reset_index(drop = True)
+
+    # Fill in the optional columns
+    for column, default in [("option_type", "european"), ("call_put", "call"), ("solver", None)]:
+        if column not in contracts.columns:
+            contracts[column] = default
+
+    # None is not a valid groupby key, so use an empty string as a stand in for "no solver"
+    contracts["solver"] = contracts["solver"].fillna("")
+
+    prices = np.empty(len(contracts))
+
+    group_columns = ["method", "solver", "option_type", "call_put"]
+
+    if options is None:
+        options = {}
+
+    used_options = set()
+
+    for (method, solver, option_type, call_put), group in contracts.groupby(group_columns, sort = False):
+
+        if solver == "":
+            solver = None
+
+        # Validation
+        validate_option_type(option_type)
+        validate_call_put(call_put)
+        validate_method_solver_combination(method, solver, option_type)
+
+        # Set option defaults and update to the user defined options this group uses
+        option_defaults = get_option_defaults(method, solver, option_type)
+        group_options = {name: value for name, value in options.items() if name in option_defaults}
+        used_options.update(group_options.keys())
+
+        option_values = replace_options(group_options, option_defaults)
+
+        pricing_function = dispatch_pricing_function(method, solver, option_type, call_put)
+        batch_pricing_function = dispatch_batch_pricing_function(method, solver, option_type)
+
+        prices[group.index] = price_group(pricing_function, batch_pricing_function, method, call_put, group,
+                                          option_values)
+
+    # If an option was specified that no group uses, warn it was ignored
+    for name in options.keys():
+        if name not in used_options:
+            print("Ignoring misspecified option: " + name)
+
+    return prices
+
+
+def price_group(pricing_function, batch_pricing_function, method, call_put, group, option_values, batch_size = 1000):
+    '''Price every contract in a group that shares the same pricing function
+    '''
+
+    market_columns = ["s", "k", "r", "div_yield", "sigma", "t_terminal", "t"]
+
+    market_values = [group[column].to_numpy(dtype = float) for column in market_columns]
+
+    # The closed form solution and american approximations broadcast over arrays, so the whole group is priced at once
+    if method in ["closed_form", "american_approx"]:
+        return pricing_function(*market_values, **option_values)
+
+    group_prices = np.empty(len(group))
+
+    # Batch pricing functions hold a few (N+1) x batch_size arrays, so the group is split up to bound memory
+    if batch_pricing_function is not None:
+
+        for start in range(0, len(group), batch_size):
+            batch = slice(start, start + batch_size)
+            group_prices[batch] = batch_pricing_function(*[values[batch] for values in market_values], call_put,
+                                                         **option_values)
+
+        return group_prices
+
+    for i, row in enumerate(zip(*market_values)):
+        group_prices[i] = pricing_function(*row, **option_values)
+
+    return group_prices
+
+
+def price_option_greeks(s, k, r, div_yield, sigma, t_terminal, t, call_put = "call"):
+    '''Black Scholes price and Greeks of European options, all from one evaluation of d_1 and d_2
+
+    The inputs are the same as for price_option, and broadcast against each other like Numpy arrays.
+
+    Returns
+    -------
+    greeks : named tuple
+        A Greeks tuple of price, delta, gamma, vega, theta, rho and dividend_rho.
+    '''
+
+    validate_call_put(call_put)
+
+    return closed_form_greeks(s, k, r, div_yield, sigma, t_terminal, t, call_put)
+
+
+def price_option_chain(s, r, div_yield, sigma, t_terminal, t, contracts, options = None):
+    '''Price a chain of options on one underlying by Monte Carlo, from a single simulation
+
+    Parameters
+    ----------
+    s : double
+        The initial price of the asset.
+    r : double
+        The risk free interest rate to discount at.
+    div_yield : double
+        The dividend yield
+    sigma : double
+        The volatility of the stock.
+    t_terminal : double
+        The terminal time.
+    t : double
+        The initial time.
+    contracts : pandas DataFrame or dict
+        One row per contract. The "k" column is required. The optional columns "call_put" (default "call") and
+        "option_type" (default "european") take the same values as in price_option.
+    options : dict
+        A named dict containing overrides for the Monte Carlo parameters. Use get_chain_option_defaults() to see them.
+
+    Returns
+    -------
+    prices : Numpy 1D array
+        The option prices, in the same order as the rows of contracts. A MonteCarloResult of arrays with the
+        full_output option.
+    '''
+
+    # Group indices are used as positions, so the index must be 0, ..., n - 1
+    contracts = pd.DataFrame(contracts).reset_index(drop = True)
+
+    call_put = contracts.get("call_put", pd.Series("call", index = contracts.index))
+    option_type = contracts.get("option_type", pd.Series("european", index = contracts.index))
+
+    # Validation
+    for value in option_type.unique():
+        validate_option_type(value)
+
+    for value in call_put.unique():
+        validate_call_put(value)
+
+    # Set option defaults and update to user defined options
+    option_values = replace_options(options, get_chain_option_defaults())
+
+    return price_monte_carlo_chain(s, contracts["k"].to_numpy(dtype = float), (call_put == "call").to_numpy(),
+                                   (option_type == "american").to_numpy(), r, div_yield, sigma, t_terminal, t,
+                                   **option_values)
+
 # ----------------------------------------------------------------------------------------------------------------------
 # Option defaults and updating
 
-def get_option_defaults(method, solver):
+def get_option_defaults(method, solver, option_type = "european"):
 
     if method in ["crank_nicholson", "explicit_fdm", "implicit_fdm"]:
 
         option_defaults = {"x_min" : -2.5,
                            "x_max" : 2.5,
                            "dx"    : 0.05,
-                           "dtau"  : 0.00125}
+                           "dtau"  : 0.00125,
+                           "output": "price",
+                           "keep_surface" : False,
+                           "cache" : True}
 
         if solver == "iterative" :
             option_defaults["omega"] = 1.1
             option_defaults["tol"]   = 1e-6
+            option_defaults["ordering"] = "red_black"
 
     elif method == "monte_carlo":
 
-        option_defaults = {"n"    : 500,
-                           "dt"   : 0.00125,
-                           "seed" : np.random.randint(1, 1000000)}
+        option_defaults = {"n"      : 500,
+                           "dt"     : 0.00125,
+                           "seed"   : np.random.randint(1, 1000000),
+                           "scheme" : "euler",
+                           "variance_reduction" : None,
+                           "sampling" : "pseudo",
+                           "full_output" : False,
+                           "target_std_error" : None,
+                           "chunk_size" : 10000,
+                           "max_paths" : 1000000,
+                           "max_time" : None,
+                           "n_workers" : None}
+
+        if option_type == "american" :
+            option_defaults["basis"] = "monomial"
+            option_defaults["layout"] = "path_major"
+            option_defaults["path_file"] = None
+            option_defaults["path_generation"] = "forward"
+
+    elif method == "multilevel_monte_carlo":
+
+        option_defaults = {"seed"        : np.random.randint(1, 1000000),
+                           "target_rmse" : 0.05,
+                           "scheme"      : "milstein",
+                           "n_steps_0"   : 1,
+                           "n_initial"   : 10000,
+                           "min_levels"  : 2,
+                           "max_levels"  : 10,
+                           "full_output" : False}
 
     elif method == "closed_form":
 
-        option_defaults = {}
+        option_defaults = {"out" : None}
+
+    elif method == "american_approx":
+
+        option_defaults = {"approximation" : "barone_adesi_whaley"}
+
+    return option_defaults
+
+
+def get_chain_option_defaults():
+
+    option_defaults = {"n"      : 500,
+                       "dt"     : 0.00125,
+                       "seed"   : np.random.randint(1, 1000000),
+                       "scheme" : "euler",
+                       "basis"  : "monomial",
+                       "variance_reduction" : None,
+                       "sampling" : "pseudo",
+                       "full_output" : False}
 
     return option_defaults
 
@@ -132,7 +406,8 @@ def validate_call_put(call_put):
 
 def validate_method_solver_combination(method, solver, option_type):
 
-    valid_methods = ["crank_nicholson", "monte_carlo", "explicit_fdm", "implicit_fdm", "closed_form"]
+    valid_methods = ["crank_nicholson", "monte_carlo", "multilevel_monte_carlo", "explicit_fdm", "implicit_fdm",
+                     "closed_form", "american_approx"]
     valid_solvers = ["direct", "iterative"]
 
     methods_with_solver = ["crank_nicholson", "implicit_fdm"]
@@ -148,6 +423,12 @@ def validate_method_solver_combination(method, solver, option_type):
         if((method == "closed_form") & (option_type == "american")):
             sys.exit("Closed form solutions are not available for american options.")
 
+        if((method == "multilevel_monte_carlo") & (option_type == "american")):
+            sys.exit("Multilevel Monte Carlo is not available for american options.")
+
+        if((method == "american_approx") & (option_type == "european")):
+            sys.exit("The american approximations are only for american options. Use closed_form for european options.")
+
     else:
 
         sys.exit("Incorrect method. Valid methods are: " + ', '.join(valid_methods))
@@ -0,0 +1,166 @@
+import sys
+import numpy as np
+from scipy.special import ndtr
+from pricing_function_closed_form import pricing_function_closed_form_european_call
+from pricing_function_closed_form import pricing_function_closed_form_european_put
+from pricing_function_closed_form import d_1_d_2
+
+def pricing_function_american_approximation(call_put):
+    '''Retrieve an analytic approximation pricing function for an american call/put
+
+    The approximation option picks the formula:
+    "barone_adesi_whaley"  : the quadratic approximation of Barone-Adesi and Whaley (1987). The early exercise
+                             premium solves an approximate ODE, and the critical stock price is found by a
+                             vectorized Newton iteration.
+    "bjerksund_stensland"  : the flat exercise boundary approximation of Bjerksund and Stensland (1993). Puts are
+                             priced as calls by the put-call transformation P(S, K, r, q) = C(K, S, q, r).
+
+    Both broadcast over arrays of every input. They take microseconds per option, and are accurate to a few cents
+    for typical inputs, so they suit a first mark or a starting point for the FDM and Monte Carlo methods.
+    '''
+
+    def pricing_function_american_approximation_implementation(s, k, r, div_yield, sigma, t_terminal, t,
+                                                               approximation = "barone_adesi_whaley"):
+
+        s, k, r, div_yield, sigma, tau = [np.array(x, dtype = float) for x in
+                                          np.broadcast_arrays(s, k, r, div_yield, sigma, t_terminal - np.asarray(t))]
+
+        if approximation == "barone_adesi_whaley":
+            V = barone_adesi_whaley(s, k, r, div_yield, sigma, tau, call_put)
+        elif approximation == "bjerksund_stensland":
+            if call_put == "call":
+                V = bjerksund_stensland_call(s, k, r, div_yield, sigma, tau)
+            else:
+                V = bjerksund_stensland_call(k, s, div_yield, r, sigma, tau)
+        else:
+            sys.exit("Invalid approximation. Valid approximations are: barone_adesi_whaley, bjerksund_stensland")
+
+        return V[()]
+
+    return pricing_function_american_approximation_implementation
+
+
+def barone_adesi_whaley(s, k, r, div_yield, sigma, tau, call_put, tol = 1e-8, max_iter = 100):
+    '''Barone-Adesi and Whaley price of american calls or puts on arrays of inputs of the same shape
+    '''
+
+    b = r - div_yield
+    sigma_sqrt_tau = sigma * np.sqrt(tau)
+
+    M = 2 * r / sigma**2
+    N = 2 * b / sigma**2
+    K = 1 - np.exp(-1 * r * tau)
+
+    if call_put == "call":
+        european = pricing_function_closed_form_european_call
+        sign = 1
+    else:
+        european = pricing_function_closed_form_european_put
+        sign = -1
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+
+        # M / K tends to 2 / (sigma^2 tau) as r goes to 0
+        M_over_K = np.where(r == 0, 2 / (sigma**2 * tau), M / K)
+
+        # The exponent of the early exercise premium, and its limit as tau goes to infinity
+        q_exponent = 0.5 * (-(N - 1) + sign * np.sqrt((N - 1)**2 + 4 * M_over_K))
+        q_infinity = 0.5 * (-(N - 1) + sign * np.sqrt((N - 1)**2 + 4 * M))
+
+        # Seed the critical price from its perpetual value, which is infinite when early exercise is never optimal
+        s_infinity = k / (1 - 1 / q_infinity)
+        if call_put == "call":
+            h = -1 * (b * tau + 2 * sigma_sqrt_tau) * k / (s_infinity - k)
+            s_critical = k + (s_infinity - k) * (1 - np.exp(h))
+        else:
+            h = (b * tau - 2 * sigma_sqrt_tau) * k / (k - s_infinity)
+            s_critical = s_infinity + (k - s_infinity) * np.exp(h)
+
+    # Without a dividend (call) or an interest rate (put), early exercise is never optimal. Those options keep a
+    # finite critical price out of the iteration, and are priced as european at the end.
+    never_exercise = (div_yield <= 0) if call_put == "call" else (r <= 0)
+    s_critical = np.where(never_exercise, k, s_critical)
+
+    # Newton iteration on sign * (S* - K) = V(S*) + sign * (1 - exp((b - r) tau) N(sign * d_1(S*))) S* / q
+    carry_discount = np.exp((b - r) * tau)
+    active = np.ones(s.shape, dtype = bool)
+
+    for iteration in range(max_iter):
+
+        d_1_value = d_1_d_2(s_critical, k, r, div_yield, tau, 0, sigma)[0]
+        F_d_1 = ndtr(sign * d_1_value)
+        pdf_d_1 = np.exp(-0.5 * d_1_value**2) / np.sqrt(2 * np.pi)
+
+        lhs = sign * (s_critical - k)
+        rhs = european(s_critical, k, r, div_yield, sigma, tau, 0) \
+              + sign * (1 - carry_discount * F_d_1) * s_critical / q_exponent
+
+        # The slope of rhs in S*
+        slope = sign * carry_discount * F_d_1 * (1 - 1 / q_exponent) \
+                + sign * (1 - sign * carry_discount * pdf_d_1 / sigma_sqrt_tau) / q_exponent
+
+        active = (np.abs(lhs - rhs) > tol * k) & ~never_exercise
+        if not np.any(active):
+            break
+
+        s_critical = np.where(active, (k + sign * (rhs - slope * s_critical)) / (1 - sign * slope), s_critical)
+
+    d_1_value = d_1_d_2(s_critical, k, r, div_yield, tau, 0, sigma)[0]
+    A = sign * s_critical / q_exponent * (1 - carry_discount * ndtr(sign * d_1_value))
+
+    with np.errstate(divide = "ignore", invalid = "ignore", over = "ignore"):
+        V = european(s, k, r, div_yield, sigma, tau, 0) + A * (s / s_critical)**q_exponent
+
+    # Past the critical price, exercise immediately
+    V = np.where(sign * (s - s_critical) >= 0, sign * (s - k), V)
+
+    return np.where(never_exercise, european(s, k, r, div_yield, sigma, tau, 0), V)
+
+
+def bjerksund_stensland_call(s, k, r, div_yield, sigma, tau):
+    '''Bjerksund and Stensland (1993) price of american calls on arrays of inputs of the same shape
+    '''
+
+    b = r - div_yield
+    sigma_sqrt_tau = sigma * np.sqrt(tau)
+
+    with np.errstate(divide = "ignore", invalid = "ignore", over = "ignore"):
+
+        beta = (0.5 - b / sigma**2) + np.sqrt((b / sigma**2 - 0.5)**2 + 2 * r / sigma**2)
+        b_infinity = beta / (beta - 1) * k
+        b_0 = np.maximum(k, r / (r - b) * k)
+
+        # The flat exercise boundary
+        h = -1 * (b * tau + 2 * sigma_sqrt_tau) * b_0 / (b_infinity - b_0)
+        boundary = b_0 + (b_infinity - b_0) * (1 - np.exp(h))
+
+        alpha = (boundary - k) * boundary**(-beta)
+
+        V = alpha * s**beta \
+            - alpha * phi(s, tau, beta, boundary, boundary, r, b, sigma) \
+            + phi(s, tau, 1, boundary, boundary, r, b, sigma) \
+            - phi(s, tau, 1, k, boundary, r, b, sigma) \
+            - k * phi(s, tau, 0, boundary, boundary, r, b, sigma) \
+            + k * phi(s, tau, 0, k, boundary, r, b, sigma)
+
+    # Past the boundary, exercise immediately
+    V = np.where(s >= boundary, s - k, V)
+
+    # When the carry is at least the interest rate, early exercise is never optimal
+    european = pricing_function_closed_form_european_call(s, k, r, div_yield, sigma, tau, 0)
+
+    return np.where(b >= r, european, V)
+
+
+def phi(s, tau, gamma, h, boundary, r, b, sigma):
+    '''The phi function of Bjerksund and Stensland, the value of a claim on S^gamma knocked out at boundary
+    '''
+
+    sigma_sqrt_tau = sigma * np.sqrt(tau)
+
+    lamba = (-1 * r + gamma * b + 0.5 * gamma * (gamma - 1) * sigma**2) * tau
+    d = -1 * (np.log(s / h) + (b + (gamma - 0.5) * sigma**2) * tau) / sigma_sqrt_tau
+    kappa = 2 * b / sigma**2 + (2 * gamma - 1)
+
+    return np.exp(lamba) * s**gamma * (ndtr(d) - (boundary / s)**kappa
+                                       * ndtr(d - 2 * np.log(boundary / s) / sigma_sqrt_tau))
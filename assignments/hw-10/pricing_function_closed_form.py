@@ -1,8 +1,15 @@
 # Imports
-from math import log
-from math import sqrt
-from math import exp
-from scipy.stats import norm
+from numpy import log
+from numpy import sqrt
+from numpy import exp
+from numpy import multiply
+from numpy import pi
+from scipy.special import ndtr
+from collections import namedtuple
+import math
+
+# Returned by closed_form_greeks(). Each field broadcasts like the inputs
+Greeks = namedtuple("Greeks", ["price", "delta", "gamma", "vega", "theta", "rho", "dividend_rho"])
 
 def pricing_function_closed_form(call_put):
     '''Retrieve the closed form solution pricing function for a european call/put
@@ -16,7 +23,21 @@ def pricing_function_closed_form(call_put):
 
     return pricing_function
 
-def pricing_function_closed_form_european_call(s, k, r, div_yield, sigma, t_terminal, t):
+def pricing_function_closed_form_scalar(call_put):
+    '''Retrieve a closed form pricing function for a single european call/put, using only the math module
+
+    Every Numpy or scipy call has a fixed overhead that dwarfs the arithmetic of one quote, so these only accept
+    scalars.
+    '''
+
+    if call_put == "call":
+        pricing_function = pricing_function_closed_form_scalar_call
+    elif call_put == "put":
+        pricing_function = pricing_function_closed_form_scalar_put
+
+    return pricing_function
+
+def pricing_function_closed_form_european_call(s, k, r, div_yield, sigma, t_terminal, t, out = None):
 
     """
     Calculate the value of a european call option
@@ -27,18 +48,21 @@ def pricing_function_closed_form_european_call(s, k, r, div_yield, sigma, t_term
     :param t_terminal: Terminal time
     :param t:          Starting time
     :param sigma:      Volatility
+    :param out:        Optional preallocated array to write the values into
     :return:           Value of the european call option at time t
     """
 
     # Normal CDF values of d_1 and d_2 respectively
-    F_d_1 = norm.cdf(d_1(s, k, r, div_yield, t_terminal, t, sigma))
-    F_d_2 = norm.cdf(d_2(s, k, r, div_yield, t_terminal, t, sigma))
+    d_1_value, d_2_value = d_1_d_2(s, k, r, div_yield, t_terminal, t, sigma)
+    F_d_1 = ndtr(d_1_value)
+    F_d_2 = ndtr(d_2_value)
 
     # Value of the option from the closed form solution of Black Scholes
-    V = s * exp(-1 * div_yield * (t_terminal - t)) * F_d_1 - k * exp(-1 * r * (t_terminal - t)) * F_d_2
+    V = multiply(s * exp(-1 * div_yield * (t_terminal - t)), F_d_1, out = out)
+    V -= k * exp(-1 * r * (t_terminal - t)) * F_d_2
     return V
 
-def pricing_function_closed_form_european_put(s, k, r, div_yield, sigma, t_terminal, t):
+def pricing_function_closed_form_european_put(s, k, r, div_yield, sigma, t_terminal, t, out = None):
 
     """
     Calculate the value of a european put option
@@ -49,17 +73,100 @@ def pricing_function_closed_form_european_put(s, k, r, div_yield, sigma, t_termi
     :param t_terminal: Terminal time
     :param t:          Starting time
     :param sigma:      Volatility
+    :param out:        Optional preallocated array to write the values into
     :return:           Value of the european put option at time t
     """
 
     # Normal CDF values of -d_1 and -d_2 respectively
-    F_neg_d_1 = norm.cdf(-1 * d_1(s, k, r, div_yield, t_terminal, t, sigma))
-    F_neg_d_2 = norm.cdf(-1 * d_2(s, k, r, div_yield, t_terminal, t, sigma))
+    d_1_value, d_2_value = d_1_d_2(s, k, r, div_yield, t_terminal, t, sigma)
+    F_neg_d_1 = ndtr(-1 * d_1_value)
+    F_neg_d_2 = ndtr(-1 * d_2_value)
 
     # Value of the option from the closed form solution of Black Scholes
-    V = -1 * s * exp(-1 * div_yield * (t_terminal - t)) * F_neg_d_1 + k * exp(-1 * r * (t_terminal - t)) * F_neg_d_2
+    V = multiply(k * exp(-1 * r * (t_terminal - t)), F_neg_d_2, out = out)
+    V -= s * exp(-1 * div_yield * (t_terminal - t)) * F_neg_d_1
     return V
 
+def pricing_function_closed_form_scalar_call(s, k, r, div_yield, sigma, t_terminal, t):
+
+    """
+    Calculate the value of a single european call option. See pricing_function_closed_form_european_call
+    """
+
+    tau = t_terminal - t
+    sigma_sqrt_tau = sigma * math.sqrt(tau)
+
+    d_1_value = (math.log(s / k) + (r - div_yield + 0.5 * sigma * sigma) * tau) / sigma_sqrt_tau
+    d_2_value = d_1_value - sigma_sqrt_tau
+
+    # N(d) = erfc(-d / sqrt(2)) / 2
+    return 0.5 * (s * math.exp(-div_yield * tau) * math.erfc(-d_1_value * 0.7071067811865476)
+                  - k * math.exp(-r * tau) * math.erfc(-d_2_value * 0.7071067811865476))
+
+def pricing_function_closed_form_scalar_put(s, k, r, div_yield, sigma, t_terminal, t):
+
+    """
+    Calculate the value of a single european put option. See pricing_function_closed_form_european_put
+    """
+
+    tau = t_terminal - t
+    sigma_sqrt_tau = sigma * math.sqrt(tau)
+
+    d_1_value = (math.log(s / k) + (r - div_yield + 0.5 * sigma * sigma) * tau) / sigma_sqrt_tau
+    d_2_value = d_1_value - sigma_sqrt_tau
+
+    # N(-d) = erfc(d / sqrt(2)) / 2
+    return 0.5 * (k * math.exp(-r * tau) * math.erfc(d_2_value * 0.7071067811865476)
+                  - s * math.exp(-div_yield * tau) * math.erfc(d_1_value * 0.7071067811865476))
+
+
+def closed_form_greeks(s, k, r, div_yield, sigma, t_terminal, t, call_put = "call"):
+
+    """
+    Calculate the value and Greeks of a european call or put option in one pass
+    :param s:          Stock price at time t
+    :param k:          Strike price at time T
+    :param r:          Risk free rate
+    :param div_yield:  Continuous dividend yield
+    :param t_terminal: Terminal time
+    :param t:          Starting time
+    :param sigma:      Volatility
+    :param call_put:   Either "call" or "put"
+    :return:           Greeks of the price and its derivatives with respect to s (delta, gamma), sigma (vega),
+                       t (theta, per year of calendar time), r (rho) and div_yield (dividend_rho)
+    """
+
+    tau = t_terminal - t
+    sqrt_tau = sqrt(tau)
+
+    d_1_value, d_2_value = d_1_d_2(s, k, r, div_yield, t_terminal, t, sigma)
+
+    # Discounted stock and strike, shared by every Greek
+    s_discounted = s * exp(-1 * div_yield * tau)
+    k_discounted = k * exp(-1 * r * tau)
+
+    # The normal PDF at d_1. The terms in the PDF at d_2 cancel, since s_discounted * pdf(d_1) = k_discounted * pdf(d_2)
+    pdf_d_1 = exp(-0.5 * d_1_value**2) / sqrt(2 * pi)
+
+    # For a put, N(d) is replaced by -N(-d) throughout
+    if call_put == "call":
+        F_d_1 = ndtr(d_1_value)
+        F_d_2 = ndtr(d_2_value)
+    else:
+        F_d_1 = -1 * ndtr(-1 * d_1_value)
+        F_d_2 = -1 * ndtr(-1 * d_2_value)
+
+    price        = s_discounted * F_d_1 - k_discounted * F_d_2
+    delta        = exp(-1 * div_yield * tau) * F_d_1
+    gamma        = s_discounted * pdf_d_1 / (s * s * sigma * sqrt_tau)
+    vega         = s_discounted * pdf_d_1 * sqrt_tau
+    theta        = -1 * s_discounted * pdf_d_1 * sigma / (2 * sqrt_tau) - r * k_discounted * F_d_2 \
+                   + div_yield * s_discounted * F_d_1
+    rho          = tau * k_discounted * F_d_2
+    dividend_rho = -1 * tau * s_discounted * F_d_1
+
+    return Greeks(price, delta, gamma, vega, theta, rho, dividend_rho)
+
 
 ### Utils
 
@@ -81,4 +188,16 @@ def d_2(s, k, r, div_yield, t_terminal, t, sigma):
     Calculate d_2 as specified by Black Scholes
     """
 
-    return d_1(s, k, r, div_yield, t_terminal, t, sigma) - sigma * sqrt(t_terminal - t)
\ No newline at end of file
+    return d_1(s, k, r, div_yield, t_terminal, t, sigma) - sigma * sqrt(t_terminal - t)
+
+def d_1_d_2(s, k, r, div_yield, t_terminal, t, sigma):
+
+    """
+    Calculate d_1 and d_2 together, sharing sigma * sqrt(t_terminal - t)
+    """
+
+    sigma_sqrt_tau = sigma * sqrt(t_terminal - t)
+
+    d_1_value = (log(s / k) + (r - div_yield + sigma**2 / 2) * (t_terminal - t)) / sigma_sqrt_tau
+
+    return d_1_value, d_1_value - sigma_sqrt_tau
\ No newline at end of file
@@ -1,7 +1,13 @@
+import sys
 import numpy as np
-from scipy.sparse import spdiags
 from scipy.interpolate import interp1d
 from solvers import get_solver_function
+from thomas import thomas_factor
+from collections import OrderedDict
+
+# Dimensionless FDM solutions, shared across strikes. See pricing_function_fdm().
+fdm_cache = OrderedDict()
+fdm_cache_size = 256
 
 def pricing_function_fdm(method, solver, option_type, call_put):
     '''Retrieve the FDM pricing function based on user inputs
@@ -13,6 +19,19 @@ def pricing_function_fdm(method, solver, option_type, call_put):
 
     The implementation follows the Prototype Core algorithm
 
+    Only the current and next time levels of w are held in memory. Setting the keep_surface option
+    retains the full (N+1) x (M+1) w grid, and the pricing function then returns (result, w_grid).
+
+    A single solve values the option at every node of the spot grid, so s can be an array of spot prices.
+    The output option controls what is returned:
+    output = "price"       : the interpolated price at s (an array if s is an array)
+    output = "values"      : a tuple of (s_vec, option_values) at every node of the spot grid
+    output = "interpolant" : the linear interpolant of the option values, to evaluate at any spot price
+
+    The solution in x = log(S/K) does not depend on the strike. With the cache option (on by default), it is
+    kept in fdm_cache, so later calls with the same sigma, r, div_yield, t_terminal and grid only rescale it
+    to the new strike and interpolate. The cache holds the most recent fdm_cache_size solutions.
+
     '''
 
     # Only thing that changes put/call
@@ -22,17 +41,14 @@ def pricing_function_fdm(method, solver, option_type, call_put):
         g = g_put
 
     # Define theta
-    if method == "crank_nicholson":
-        theta = 0.5
-    elif method == "implicit_fdm":
-        theta = 1
-    elif method == "explicit_fdm":
-        theta = 0
+    theta = get_theta(method)
 
     # Get the correct solver function
     solver_function = get_solver_function(option_type, solver)
 
-    def pricing_function_fdm_implementation(s, k, r, div_yield, sigma, t_terminal, t, x_min, x_max, dx, dtau, omega = None, tol = None):
+    def solve_dimensionless(r, div_yield, sigma, t_terminal, x_min, x_max, dx, dtau, omega, tol, ordering, keep_surface):
+        '''Solve the heat equation for w, returning (x_vec, tau_max, w at tau_max, w_grid or None)
+        '''
 
         lamba = dtau / (dx ** 2)
 
@@ -44,90 +60,305 @@ def pricing_function_fdm(method, solver, option_type, call_put):
         M = int(0.5 * sigma ** 2 * t_terminal * (1 / dtau))
         tau_vec = np.arange(M+1) * dtau          # 0:M
 
-        # Set the tridiagonal matrix A
+        # Set the tridiagonal matrix A, stored as its (sub, main, super) diagonals
         size = N-1
-        main_diag = 1 + 2 * theta * lamba * np.ones(size)
-        sub_diag = - lamba * theta * np.ones(size)
-        sup_diag = sub_diag
-        A_data = np.array([main_diag, sub_diag, sup_diag])
-        tri_set = np.array([0, -1, 1])
-        A = spdiags(A_data, tri_set, size, size).toarray()
+        A = tridiagonal_matrix(size, - lamba * theta, 1 + 2 * theta * lamba, - lamba * theta)
 
-        # Set up the g grid
-        g_grid = np.zeros([N+1, M+1])
-        for i in range(M+1):
-            g_grid[:, i] = g(x_vec, tau_vec[i], r, div_yield, sigma)
+        # A is the same at every time step, so direct solvers factor it once up front
+        if(omega is None or tol is None):
+            A = thomas_factor(A)
 
-        # Set up the w grid
-        w_grid = np.zeros([N+1, M+1])
+        # Only two time levels are kept, w^i and w^(i+1). g is computed on demand for the next level.
+        w_this = g(x_vec, tau_vec[0], r, div_yield, sigma)
+        w_next = np.zeros(N+1)
 
-        # Init w grid with boundaries
-        w_grid[:, 0]   = g_grid[:, 0]
-        w_grid[0, :]   = g_grid[0, :]
-        w_grid[N, :]   = g_grid[N, :]
+        # Optionally retain the full w grid
+        if keep_surface:
+            w_grid = np.zeros([N+1, M+1])
+            w_grid[:, 0] = w_this
 
+        # Right hand side buffer, reused at every time step
+        b_i = np.zeros(N - 1) # 1:(N-1)
 
         # tau loop
         for i in range(M):
 
-            # Set up and fill b_i
-            b_i = np.zeros([N - 1, 1]) # 1:(N-1)
-
-            for j in range(1, N): # 1:(N-1)
-                b_i[j-1] = w_grid[j, i] + (1-theta) * lamba * (w_grid[j - 1, i] - 2 * w_grid[j, i] + w_grid[j + 1, i])
-
-                if(j == 1):
-                    b_i[j-1] = b_i[j-1] + theta * lamba * w_grid[0, i + 1]
+            # g at the next time level, and the boundaries of w^(i+1)
+            g_next = g(x_vec, tau_vec[i + 1], r, div_yield, sigma)
+            w_next[0] = g_next[0]
+            w_next[N] = g_next[N]
 
-                if(j == N - 1):
-                    b_i[j-1] = b_i[j-1] + theta * lamba * w_grid[N, i + 1]
+            # Fill b_i in place, as whole array operations on the interior of w^i
+            np.multiply(w_this[1:N], 2, out = b_i)
+            np.subtract(w_this[0:N-1], b_i, out = b_i)
+            b_i += w_this[2:N+1]
+            b_i *= (1-theta) * lamba
+            b_i += w_this[1:N]
 
+            # Boundary corrections for the first and last interior rows
+            b_i[0]   += theta * lamba * w_next[0]
+            b_i[N-2] += theta * lamba * w_next[N]
 
-            # Pass v, b_i, and A to the solver
-            # The result is the w^(i+1) subset of the grid
+            # Pass v, b_i, and A (or its factorization) to the solver
+            # The result is the interior of w^(i+1)
             # if Iterative solving
             if(omega is not None and tol is not None):
 
                 # Create guess
-                # w_i and g_{i+1} are subsets of their grids without the first and last rows
-                w_i = w_grid[1:N, i]
-                g_ip1 = g_grid[1:N, i + 1]
+                # w_i and g_{i+1} are the interiors of their levels without the first and last rows
+                w_i = w_this[1:N]
+                g_ip1 = g_next[1:N]
                 v = np.maximum(w_i, g_ip1)
 
                 if(option_type == "european"):
                     # SOR
-                    w_grid[1:N, i + 1] = solver_function(A, b_i, guess = v, relax_param = omega, tol = tol)
+                    w_next[1:N] = solver_function(A, b_i, guess = v, relax_param = omega, tol = tol, ordering = ordering)
                 else:
                     # PSOR
-                    w_grid[1:N, i + 1] = solver_function(A, b_i, g_ip1, guess = v, relax_param = omega, tol = tol)
+                    w_next[1:N] = solver_function(A, b_i, g_ip1, guess = v, relax_param = omega, tol = tol, ordering = ordering)
 
             # Else directly solving
             else:
                 if(option_type == "european"):
                     # Thomas
-                    w_grid[1:N, i + 1] = solver_function(A, b_i)
+                    w_next[1:N] = solver_function(A, b_i)
                 else:
                     # Brennan
-                    g_ip1 = g_grid[1:N, i + 1]
-                    w_grid[1:N, i + 1] = solver_function(A, b_i, g_ip1)
+                    g_ip1 = g_next[1:N]
+                    w_next[1:N] = solver_function(A, b_i, g_ip1)
 
+            if keep_surface:
+                w_grid[:, i + 1] = w_next
+
+            # Roll the time levels forward
+            w_this, w_next = w_next, w_this
+
+        if not keep_surface:
+            w_grid = None
+
+        return x_vec, tau_vec[M], w_this, w_grid
+
+    def pricing_function_fdm_implementation(s, k, r, div_yield, sigma, t_terminal, t, x_min, x_max, dx, dtau, omega = None, tol = None, ordering = "lexicographic", output = "price", keep_surface = False, cache = True):
+
+        # w at tau_max, in x = log(S/K), does not depend on k. It is solved once and cached, and every strike
+        # is then priced from it by the rescaling and interpolation below.
+        cache_key = (method, solver, option_type, call_put, r, div_yield, sigma, t_terminal,
+                     x_min, x_max, dx, dtau, omega, tol, ordering)
+
+        if cache and not keep_surface and cache_key in fdm_cache:
+            x_vec, tau_max, w_M = fdm_cache[cache_key]
+            fdm_cache.move_to_end(cache_key)
+
+        else:
+            x_vec, tau_max, w_M, w_grid = solve_dimensionless(r, div_yield, sigma, t_terminal, x_min, x_max, dx, dtau,
+                                                              omega, tol, ordering, keep_surface)
+            if cache:
+                store_in_fdm_cache(cache_key, (x_vec, tau_max, w_M))
 
-        # Convert back to real world variables
-        s_vec = k * np.exp(x_vec)
         q     = calc_q(r, sigma)
         q_div = calc_q_div(r, sigma, div_yield)
-        tau_max = tau_vec[M]
-        option_values = k * np.exp(-0.5 * (q_div - 1) * x_vec - (0.25 * (q_div - 1) ** 2 + q) * tau_max) * w_grid[:, M]
+
+        # A single price only needs the two grid points around it, interpolated as interp1d would
+        if output == "price" and not keep_surface and np.ndim(s) == 0:
+            s_bounds = k * np.exp(x_vec[[0, -1]])
+            if s < s_bounds[0] or s > s_bounds[1]:
+                raise ValueError("A value in x_new is outside the interpolation range.")
+
+            i = min(max(np.searchsorted(x_vec, np.log(s / k)), 1), x_vec.shape[0] - 1)
+            x_pair = x_vec[i - 1:i + 1]
+            s_pair = k * np.exp(x_pair)
+            value_pair = k * np.exp(-0.5 * (q_div - 1) * x_pair - (0.25 * (q_div - 1) ** 2 + q) * tau_max) * w_M[i - 1:i + 1]
+
+            slope = (value_pair[1] - value_pair[0]) / (s_pair[1] - s_pair[0])
+            return float(slope * (s - s_pair[0]) + value_pair[0])
+
+        # Convert back to real world variables
+        s_vec = k * np.exp(x_vec)
+        option_values = k * np.exp(-0.5 * (q_div - 1) * x_vec - (0.25 * (q_div - 1) ** 2 + q) * tau_max) * w_M
 
         # Interpolate to find the exact option value
         interp_fun = interp1d(s_vec, option_values)
-        option_v = interp_fun(s).item()
 
-        return option_v
+        if output == "price":
+            result = interp_fun(s)
+            if result.ndim == 0:
+                result = result.item()
+        elif output == "values":
+            result = (s_vec, option_values)
+        elif output == "interpolant":
+            result = interp_fun
+        else:
+            sys.exit("Invalid output. Valid outputs are: price, values, interpolant")
+
+        if keep_surface:
+            return result, w_grid
+
+        return result
 
 
     return pricing_function_fdm_implementation
 
+def pricing_function_fdm_batch(method, option_type):
+    '''Retrieve a FDM pricing function that prices a whole batch of options in a single time loop
+
+    Every option in the batch shares the x grid and dtau, and therefore the matrix A, which is factored once.
+    The K right hand sides are stacked as the columns of a (N-1) x K array and solved together by the batched
+    Thomas / Brennan solvers. Calls and puts can be mixed, as can any r, div_yield, sigma and t_terminal. Options
+    with a shorter dimensionless expiry, 0.5 * sigma^2 * t_terminal, stop updating once they reach their final
+    time level.
+
+    Only the direct solvers are supported.
+    '''
+
+    theta = get_theta(method)
+
+    solver_function = get_solver_function(option_type, "direct")
+
+    def pricing_function_fdm_batch_implementation(s, k, r, div_yield, sigma, t_terminal, t, call_put, x_min, x_max, dx, dtau, output = "price", keep_surface = False, cache = True):
+
+        # cache is accepted for option compatibility with pricing_function_fdm(), but a batch always solves its
+        # options together and does not use the single option solution cache
+
+        if keep_surface or output != "price":
+            sys.exit("Only prices can be returned when pricing options in a batch.")
+
+        # Every market input becomes a 1D array of length K
+        s, k, r, div_yield, sigma, t_terminal, t = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(value, dtype = float)) for value in [s, k, r, div_yield, sigma, t_terminal, t]]
+        )
+        call_put = np.broadcast_to(call_put, s.shape)
+
+        K = s.shape[0]
+
+        lamba = dtau / (dx ** 2)
+
+        # Space steps
+        N = int((x_max - x_min) / dx)
+        x_vec = x_min + np.arange(N+1) * dx      # 0:N
+
+        # Time steps, per option. The loop runs until the longest one is done.
+        M_vec = (0.5 * sigma ** 2 * t_terminal * (1 / dtau)).astype(int)
+        M = M_vec.max()
+        tau_vec = np.arange(M+1) * dtau          # 0:M
+
+        # Factor the shared tridiagonal matrix A once
+        size = N-1
+        A = thomas_factor(tridiagonal_matrix(size, - lamba * theta, 1 + 2 * theta * lamba, - lamba * theta))
+
+        # g(x, tau) = exp(g_rate * tau) * g(x, 0), so only g at tau = 0 is stored for each option
+        q     = calc_q(r, sigma)
+        q_div = calc_q_div(r, sigma, div_yield)
+        g_rate = 0.25 * (q_div - 1) ** 2.0 + q
+
+        g_0 = np.zeros([N+1, K])
+        for side, g in [("call", g_call), ("put", g_put)]:
+            is_side = call_put == side
+            g_0[:, is_side] = g(x_vec[:, None], 0, r[is_side], div_yield[is_side], sigma[is_side])
+
+        # Two time levels of w for every option
+        w_this = g_0.copy()
+        w_next = np.zeros([N+1, K])
+
+        b_i = np.zeros([N - 1, K])
+
+        # tau loop
+        for i in range(M):
+
+            # g at the next time level, and the boundaries of w^(i+1)
+            g_next = np.exp(g_rate * tau_vec[i + 1]) * g_0
+            w_next[0] = g_next[0]
+            w_next[N] = g_next[N]
+
+            # Fill b_i in place, as whole array operations on the interior of w^i
+            np.multiply(w_this[1:N], 2, out = b_i)
+            np.subtract(w_this[0:N-1], b_i, out = b_i)
+            b_i += w_this[2:N+1]
+            b_i *= (1-theta) * lamba
+            b_i += w_this[1:N]
+
+            # Boundary corrections for the first and last interior rows
+            b_i[0]   += theta * lamba * w_next[0]
+            b_i[N-2] += theta * lamba * w_next[N]
+
+            if(option_type == "european"):
+                # Thomas
+                w_next[1:N] = solver_function(A, b_i)
+            else:
+                # Brennan
+                w_next[1:N] = solver_function(A, b_i, g_next[1:N])
+
+            # Options that have reached their final time level keep their current values
+            is_done = i >= M_vec
+            w_next[:, is_done] = w_this[:, is_done]
+
+            # Roll the time levels forward
+            w_this, w_next = w_next, w_this
+
+        # Convert back to real world variables
+        s_vec   = k * np.exp(x_vec)[:, None]
+        tau_max = tau_vec[M_vec]
+        option_values = k * np.exp(-0.5 * (q_div - 1) * x_vec[:, None] - (0.25 * (q_div - 1) ** 2 + q) * tau_max) * w_this
+
+        # Linearly interpolate each option's values at its own s
+        if np.any((s < s_vec[0]) | (s > s_vec[N])):
+            raise ValueError("A value in s is outside of the range covered by x_min and x_max.")
+
+        hi = np.clip(np.sum(s_vec < s, axis = 0), 1, N)
+        lo = hi - 1
+        columns = np.arange(K)
+
+        slope = (option_values[hi, columns] - option_values[lo, columns]) / (s_vec[hi, columns] - s_vec[lo, columns])
+        option_v = slope * (s - s_vec[lo, columns]) + option_values[lo, columns]
+
+        return option_v
+
+
+    return pricing_function_fdm_batch_implementation
+
+def store_in_fdm_cache(cache_key, solution):
+    '''Add a dimensionless solution to the cache, evicting the least recently used one if it is full
+    '''
+
+    fdm_cache[cache_key] = solution
+
+    if len(fdm_cache) > fdm_cache_size:
+        fdm_cache.popitem(last = False)
+
+def clear_fdm_cache():
+    '''Remove every dimensionless solution from the cache
+    '''
+
+    fdm_cache.clear()
+
+def get_theta(method):
+    '''The weight on the implicit part of the theta scheme
+    '''
+
+    if method == "crank_nicholson":
+        theta = 0.5
+    elif method == "implicit_fdm":
+        theta = 1
+    elif method == "explicit_fdm":
+        theta = 0
+
+    return theta
+
+def tridiagonal_matrix(size, sub, main, sup):
+    '''Build the compact (sub, main, super) diagonal storage of a tridiagonal matrix
+
+    Each diagonal is a Numpy 1D array of length size, with sub[i] = A[i, i - 1] and sup[i] = A[i, i + 1].
+    The unused corner entries sub[0] and sup[size - 1] are set to 0.
+    '''
+
+    sub_diag  = np.full(size, sub, dtype = float)
+    main_diag = np.full(size, main, dtype = float)
+    sup_diag  = np.full(size, sup, dtype = float)
+
+    sub_diag[0]        = 0
+    sup_diag[size - 1] = 0
+
+    return sub_diag, main_diag, sup_diag
+
 def g_put(x, tau, r, div_yield, sigma):
     q = calc_q(r, sigma)
     q_div = calc_q_div(r, sigma, div_yield)
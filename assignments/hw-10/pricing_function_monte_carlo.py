@@ -1,98 +1,660 @@
-from gbm_simulator import simulate_gbm
+from gbm_simulator import simulate_gbm, simulate_gbm_terminal, simulate_gbm_backward, get_time_steps
+from pricing_function_closed_form import pricing_function_closed_form
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
-import scipy.optimize as scipy_opt
+import sys
+import time
 
-def pricing_function_monte_carlo(option_type, option_price_at_T):
+# Returned by the Monte Carlo pricing functions when the full_output option is set
+MonteCarloResult = namedtuple("MonteCarloResult", ["price", "std_error", "n_paths"])
+
+# American standard errors are estimated across chunk means, which need enough chunks, each large enough for the
+# regressions of the exercise policy
+AMERICAN_MIN_CHUNKS = 20
+AMERICAN_MIN_CHUNK_PATHS = 1000
+
+# Independently scrambled Sobol runs, whose means are the samples of the quasi-Monte Carlo standard error
+SOBOL_REPLICATES = 16
+
+def pricing_function_monte_carlo(option_type, call_put, option_price_at_T):
     '''Retrieve the Monte Carlo pricing function for a european/american call/put
 
-    American options are priced using the Regression 2 Method
+    American options are priced using the Regression 2 Method. The continuation value is fit by linear least
+    squares on a basis of the stock price, selected with the basis option (see basis_matrix()).
     European options are priced using GBM simulations discounted back to t=0
+
+    The scheme option picks the GBM simulation method: "euler", "milstein" or "exact". With "exact", European
+    options are simulated in a single step straight to t_terminal, and American options on the dt grid of
+    exercise dates.
+
+    The variance_reduction option picks the estimator:
+    None              : a plain average of the paths
+    "antithetic"      : paths come in pairs driven by z and -z
+    "moment_matching" : the normals of every time step are shifted and scaled to a sample mean of 0 and variance of 1
+    "control_variate" : a control with a known mean. For European options the control is the terminal price of the
+                        exact GBM solution driven by the same normals, whose mean is s exp((r - q)(T - t)). It is not
+                        the payoff itself, so the price stays a Monte Carlo estimate even with the exact scheme. For
+                        American options it is the European payoff on the same paths, whose mean is the Black Scholes
+                        closed form.
+    The sampling option ("pseudo" or "sobol") picks the source of the normals. "sobol" is a scrambled Sobol
+    quasi-Monte Carlo sequence with Brownian bridge path construction. The paths of one Sobol sequence are not
+    independent, so the n paths are split into SOBOL_REPLICATES independently scrambled runs, and the price and its
+    standard error are the mean and standard error of the run means (see simulate_sobol_replicates()). Adaptive and
+    parallel runs likewise take each chunk, which is scrambled on its own, as a single sample.
+    With the full_output option, a MonteCarloResult of (price, std_error, n_paths) is returned instead of the price.
+
+    Setting the target_std_error option replaces the fixed n with an adaptive run (see run_adaptive()). Chunks of
+    chunk_size paths are simulated until the standard error reaches the target, or max_paths / max_time is hit,
+    and a MonteCarloResult is always returned.
+
+    The exercise policy of an American option is fit on each chunk's own paths, so in adaptive and parallel runs
+    the chunk means are the independent samples, and the standard error is estimated across them. An adaptive run
+    then simulates at least AMERICAN_MIN_CHUNKS chunks before testing the target, and a parallel run splits n into
+    at least AMERICAN_MIN_CHUNKS chunks of at least AMERICAN_MIN_CHUNK_PATHS paths.
+
+    For American options, the layout option ("path_major" or "time_major") picks the memory layout the paths are
+    simulated in, and path_file stores them time major in a memory mapped file. With path_generation set to
+    "brownian_bridge", exact paths are instead generated backward in time and never stored
+    (see simulate_american_samples()).
+
+    Setting the n_workers option spreads the n paths over a pool of worker processes in chunks of chunk_size paths,
+    each with an independent random stream spawned from the seed (see run_parallel()).
     '''
 
     if option_type == "european":
 
-        def pricing_function_monte_carlo_european(s, k, r, div_yield, sigma, t_terminal, t, n, dt, seed):
-
-            s = simulate_gbm(n, s, r, div_yield, t, t_terminal, dt, sigma, method = "euler", seed = seed)
+        def pricing_function_monte_carlo_european(s, k, r, div_yield, sigma, t_terminal, t, n, dt, seed, scheme = "euler",
+                                                  variance_reduction = None, sampling = "pseudo", full_output = False,
+                                                  target_std_error = None, chunk_size = 10000, max_paths = 1000000,
+                                                  max_time = None, n_workers = None):
 
-            s_T = s[:, -1]
+            # A partial of a module level function, so it can be sent to worker processes
+            simulate_samples = partial(simulate_european_samples, s = s, k = k, r = r, div_yield = div_yield,
+                                       sigma = sigma, t_terminal = t_terminal, t = t, dt = dt, scheme = scheme,
+                                       variance_reduction = variance_reduction, sampling = sampling,
+                                       option_price_at_T = option_price_at_T)
 
-            # Apply call / put option value at T
-            v_T = option_price_at_T(s_T, k)
+            discount = np.exp(- r * t_terminal)
 
-            # Discount
-            v_0 = np.exp(- r * t_terminal) * np.mean(v_T)
+            # Each Sobol chunk is scrambled on its own, so the chunk means are the independent samples
+            simulate_chunk = simulate_samples
+            min_chunks = 1
+            if sampling == "sobol":
+                simulate_chunk = partial(simulate_mean_estimate, simulate_samples)
+                min_chunks = SOBOL_REPLICATES
 
-            return v_0
+            if target_std_error is not None:
+                mean_v_T, std_error_v_T, n_paths = run_adaptive(simulate_chunk, seed, target_std_error / discount,
+                                                                chunk_size, max_paths, max_time,
+                                                                min_samples = max(2, min_chunks))
+                return MonteCarloResult(discount * mean_v_T, discount * std_error_v_T, n_paths)
 
-        return pricing_function_monte_carlo_european
+            if n_workers is not None:
+                mean_v_T, std_error_v_T = run_parallel(simulate_chunk, seed, n, min(chunk_size, -(-n // min_chunks)),
+                                                       n_workers)
+                v_0 = discount * mean_v_T
 
-    elif option_type == "american":
+                if full_output:
+                    return MonteCarloResult(v_0, discount * std_error_v_T, n)
 
-        def pricing_function_monte_carlo_american(s, k, r, div_yield, sigma, t_terminal, t, n, dt, seed):
+                return v_0
 
-            s = simulate_gbm(n, s, r, div_yield, t, t_terminal, dt, sigma, method = "euler", seed=seed)
+            # Average, then discount
+            if sampling == "sobol":
+                v_T, n = simulate_sobol_replicates(simulate_samples, n, seed)
+            else:
+                v_T = simulate_samples(n, seed)
 
-            dt = t_terminal / float(s.shape[1] - 1)
-            g = np.zeros(s.shape)
-            tau = np.zeros(s.shape[0]) + g.shape[1] - 1
+            v_0 = discount * np.mean(v_T)
 
-            # At i = M = T, use value at T
-            g[:, -1] = option_price_at_T(s[:, -1], k)
+            if full_output:
+                return MonteCarloResult(v_0, discount * standard_error(v_T), n)
 
-            # Basis function for continuation value
-            def basis_func_C(x, a0, a1, a2, a3):
-                return a0 + (a1 * x) + (a2 * x ** 2) + (a3 * x ** 3)
+            return v_0
 
-            # Iterate backwards
-            iteration = (np.arange(g.shape[1] - 2) + 1)[::-1]
+        return pricing_function_monte_carlo_european
 
-            for i in iteration:
-                # x and y values for each regression
-                s_ik = s[:, i]
-                yvalues = np.exp(-r * (tau - i) * dt) * g[:, i + 1]
+    elif option_type == "american":
 
-                # Calculate the value of the option if this was time T
-                s_ik_v = option_price_at_T(s_ik, k)
+        # The closed form solution is the mean of the control variate
+        closed_form = pricing_function_closed_form(call_put)
 
-                # Restrict x and y to in the money points. Payoff > 0
-                itm_indices = s_ik_v > 0
-                itm_s_ik = s_ik[itm_indices]
-                itm_yvalues = yvalues[itm_indices]
+        def pricing_function_monte_carlo_american(s, k, r, div_yield, sigma, t_terminal, t, n, dt, seed, scheme = "euler",
+                                                  basis = "monomial", variance_reduction = None, sampling = "pseudo",
+                                                  full_output = False, target_std_error = None, chunk_size = 10000,
+                                                  max_paths = 1000000, max_time = None, n_workers = None,
+                                                  layout = "path_major", path_file = None,
+                                                  path_generation = "forward"):
 
-                # Fit the 3rd ordered curve
-                C_fit = scipy_opt.curve_fit(basis_func_C, itm_s_ik, itm_yvalues)
-                params = C_fit[0]
+            simulate_samples = partial(simulate_american_samples, s = s, k = k, r = r, div_yield = div_yield,
+                                       sigma = sigma, t_terminal = t_terminal, t = t, dt = dt, scheme = scheme,
+                                       basis = basis, variance_reduction = variance_reduction, sampling = sampling,
+                                       option_price_at_T = option_price_at_T, closed_form = closed_form,
+                                       layout = layout, path_file = path_file, path_generation = path_generation)
 
-                # Use the optimal parameters
-                C_hat = basis_func_C(s_ik, *params)
+            payoff_0 = option_price_at_T(s, k)
 
-                # For ALL values, which satisfy the update condition?
-                update_indices = s_ik_v >= C_hat
+            # The exercise policy is estimated from each chunk's own regressions, so the chunks (not the paths)
+            # are the independent samples of the adaptive and parallel estimates
+            simulate_chunk_estimate = partial(simulate_mean_estimate, simulate_samples)
 
-                # Logical AND operation to find:
-                # which values are in the money and satisfy the update condition?
-                itm_update_indices = np.logical_and(itm_indices, update_indices)
+            if target_std_error is not None:
+                C_0, std_error, n_paths = run_adaptive(simulate_chunk_estimate, seed, target_std_error, chunk_size,
+                                                       max_paths, max_time, min_samples = AMERICAN_MIN_CHUNKS)
+                return MonteCarloResult(max(C_0, payoff_0), std_error, n_paths)
 
-                # Copy g back a column
-                g[:, i] = g[:, i + 1]
+            if n_workers is not None:
+                # Enough chunks for the standard error across their means
+                american_chunk_size = min(chunk_size, -(-n // AMERICAN_MIN_CHUNKS))
+                if american_chunk_size < AMERICAN_MIN_CHUNK_PATHS:
+                    sys.exit("Parallel american pricing needs n of at least "
+                             + str(AMERICAN_MIN_CHUNKS * AMERICAN_MIN_CHUNK_PATHS) + " paths.")
 
-                # For the values of g that need to be updated, do the update
-                g[itm_update_indices, i] = s_ik_v[itm_update_indices]
+                C_0, std_error = run_parallel(simulate_chunk_estimate, seed, n, american_chunk_size, n_workers)
+                v_0 = max(C_0, payoff_0)
 
-                # For values of tau that need to be updated, do the update
-                tau[itm_update_indices] = i
+                if full_output:
+                    return MonteCarloResult(v_0, std_error, n)
 
-            # Discount time 1 to time 0, taking into account the correct number of discounts to use
-            g[:, 0] = np.exp(-r * tau * dt) * g[:, 1]
+                return v_0
 
             # Average the paths and take the max to get the Monte Carlo result
-            C_0 = np.mean(g[:, 0])
-            payoff_0 = option_price_at_T(s[0, 0], k)
+            if sampling == "sobol":
+                g_0, n = simulate_sobol_replicates(simulate_samples, n, seed)
+            else:
+                g_0 = simulate_samples(n, seed)
+            C_0 = np.mean(g_0)
 
             v_0 = max(C_0, payoff_0)
 
+            if full_output:
+                return MonteCarloResult(v_0, standard_error(g_0), n)
+
             return v_0
 
         return pricing_function_monte_carlo_american
 
+
+def simulate_european_samples(n_paths, seed, s, k, r, div_yield, sigma, t_terminal, t, dt, scheme, variance_reduction,
+                              sampling, option_price_at_T, rng = None):
+    '''Undiscounted European option values at T for n_paths paths, adjusted for the variance reduction
+    '''
+
+    # Exact sampling is unbiased, so only the terminal date needs to be simulated
+    time_grid = None
+    if scheme == "exact":
+        time_grid = [t, t_terminal]
+
+    statistics = None
+    if variance_reduction == "control_variate":
+        statistics = ["exact_terminal"]
+
+    # Only the terminal values are needed, so the full path matrix is never stored
+    sims = simulate_gbm_terminal(n_paths, s, r, div_yield, t, t_terminal, dt, sigma, method = scheme, seed = seed,
+                                 statistics = statistics, time_grid = time_grid,
+                                 variance_reduction = get_normals_variance_reduction(variance_reduction),
+                                 sampling = sampling, rng = rng)
+
+    control = None
+    control_mean = None
+
+    if variance_reduction == "control_variate":
+        s_T = sims["terminal"]
+        control = sims["exact_terminal"]
+        control_mean = s * np.exp((r - div_yield) * (t_terminal - t))
+    else:
+        s_T = sims
+
+    # Apply call / put option value at T
+    v_T = option_price_at_T(s_T, k)
+
+    return adjust_samples(v_T, variance_reduction, control, control_mean)
+
+
+def simulate_american_samples(n_paths, seed, s, k, r, div_yield, sigma, t_terminal, t, dt, scheme, basis,
+                              variance_reduction, sampling, option_price_at_T, closed_form, layout = "path_major",
+                              path_file = None, path_generation = "forward", rng = None):
+    '''Discounted Longstaff-Schwartz cash flows of n_paths paths, adjusted for the variance reduction
+
+    Only the current cash flow of each path and the time step it is received at (tau) are kept during the backward
+    pass, so besides the paths the memory used is O(n_paths).
+
+    With path_generation = "forward", the whole path matrix is simulated first. The pass reads it one time step at
+    a time, which is contiguous for layout = "time_major". With path_file, the paths are also stored time major in a
+    numpy.memmap at that file instead of in memory.
+
+    With path_generation = "brownian_bridge", the exact GBM paths are generated backward from the terminal values
+    (see simulate_gbm_backward()), so the path matrix is never stored at all.
+    '''
+
+    s_0 = s
+
+    t_total = get_time_steps(t, t_terminal, dt, None)[0]
+
+    if path_generation == "brownian_bridge":
+
+        if scheme != "exact" or sampling != "pseudo":
+            sys.exit("Brownian bridge path generation requires the exact scheme and pseudo random sampling.")
+
+        paths = simulate_gbm_backward(n_paths, s_0, r, div_yield, t, t_terminal, dt, sigma, seed = seed,
+                                      variance_reduction = get_normals_variance_reduction(variance_reduction),
+                                      rng = rng)
+
+    elif path_generation == "forward":
+
+        out = None
+        if path_file is not None:
+            layout = "time_major"
+            out = np.memmap(path_file, dtype = float, mode = "w+", shape = (t_total + 1, n_paths))
+
+        s = simulate_gbm(n_paths, s_0, r, div_yield, t, t_terminal, dt, sigma, method = scheme, seed = seed,
+                         variance_reduction = get_normals_variance_reduction(variance_reduction), sampling = sampling,
+                         rng = rng, layout = layout, out = out)
+
+        # Path major paths are read through a transposed view
+        if layout == "path_major":
+            s = s.T
+
+        # The time steps, from T backward
+        paths = iter(s[::-1])
+
+    else:
+
+        sys.exit("Invalid path_generation. Valid values are: forward, brownian_bridge")
+
+    dt_sim = t_terminal / float(t_total)
+
+    # At i = M = T, use value at T
+    s_T = next(paths)
+    cash_flow = option_price_at_T(s_T, k)
+    tau = np.zeros(n_paths) + t_total
+
+    # Iterate backwards
+    iteration = (np.arange(t_total - 1) + 1)[::-1]
+
+    for i, s_ik in zip(iteration, paths):
+        # x and y values for each regression
+        yvalues = np.exp(-r * (tau - i) * dt_sim) * cash_flow
+
+        # Calculate the value of the option if this was time T
+        s_ik_v = option_price_at_T(s_ik, k)
+
+        # Restrict x and y to in the money points. Payoff > 0
+        itm_indices = s_ik_v > 0
+        itm_yvalues = yvalues[itm_indices]
+
+        # Basis functions evaluated at every path
+        B = basis_matrix(s_ik, k, basis)
+
+        # Fit the continuation value by linear least squares on the in the money rows
+        params = np.linalg.lstsq(B[itm_indices], itm_yvalues, rcond = None)[0]
+
+        # Use the optimal parameters
+        C_hat = B @ params
+
+        # For ALL values, which satisfy the update condition?
+        update_indices = s_ik_v >= C_hat
+
+        # Logical AND operation to find:
+        # which values are in the money and satisfy the update condition?
+        itm_update_indices = np.logical_and(itm_indices, update_indices)
+
+        # For the cash flows that need to be updated, exercise now
+        cash_flow[itm_update_indices] = s_ik_v[itm_update_indices]
+
+        # For values of tau that need to be updated, do the update
+        tau[itm_update_indices] = i
+
+    # Discount to time 0, taking into account the correct number of discounts to use
+    v_0 = np.exp(-r * tau * dt_sim) * cash_flow
+
+    # The discounted European payoff on the same paths is the control variate
+    control = None
+    control_mean = None
+
+    if variance_reduction == "control_variate":
+        control = np.exp(-r * t_terminal) * option_price_at_T(s_T, k)
+        control_mean = np.exp(-r * t) * closed_form(s_0, k, r, div_yield, sigma, t_terminal, t)
+
+    return adjust_samples(v_0, variance_reduction, control, control_mean)
+
+
+def simulate_mean_estimate(simulate_samples, n_paths, seed, rng = None):
+    '''A single sample: the mean of the samples of n_paths paths
+    '''
+
+    return np.array([np.mean(simulate_samples(n_paths, seed, rng = rng))])
+
+
+def simulate_sobol_replicates(simulate_samples, n, seed):
+    '''The means of SOBOL_REPLICATES independently scrambled Sobol runs that share n paths, and the paths used
+
+    Each call of simulate_samples scrambles a new Sobol sequence from the random state, which is seeded once by the
+    first run. The run means are then independent unbiased estimates, and their spread gives a valid standard error.
+    The paths of each run are rounded down to an even number, so antithetic pairs stay whole.
+    '''
+
+    replicate_paths = max(2, n // SOBOL_REPLICATES // 2 * 2)
+
+    means = np.array([np.mean(simulate_samples(replicate_paths, seed if replicate == 0 else None))
+                      for replicate in range(SOBOL_REPLICATES)])
+
+    return means, replicate_paths * SOBOL_REPLICATES
+
+
+def price_monte_carlo_chain(s, k, is_call, is_american, r, div_yield, sigma, t_terminal, t, n, dt, seed,
+                            scheme = "euler", basis = "monomial", variance_reduction = None, sampling = "pseudo",
+                            full_output = False):
+    '''Price a chain of contracts on one underlying from a single set of simulated paths
+
+    k, is_call and is_american are arrays with one entry per contract. The European payoffs of all contracts are
+    evaluated in one broadcast pass over the terminal prices. The American contracts share one Longstaff-Schwartz
+    backward sweep: at each time step the basis is evaluated once, at S / s, and each contract's regression on its
+    own in the money paths is solved from batched normal equations.
+
+    Only Europeans are simulated just as in pricing_function_monte_carlo(), so with the same seed their prices match
+    a contract priced on its own. With any American contracts in the chain, the full paths are simulated on the dt
+    grid. The variance_reduction may be None, "antithetic" or "moment_matching", and the basis "monomial" or
+    "laguerre". Both span the same polynomials at S / s as at S / K, but the weight of "weighted_laguerre" depends on
+    each contract's strike, so it cannot be shared and is not available for a chain.
+
+    Returns an array of prices in contract order, or a MonteCarloResult of arrays with the full_output option.
+    '''
+
+    if variance_reduction not in [None, "antithetic", "moment_matching"]:
+        sys.exit("Invalid variance_reduction for a chain. Valid values are: antithetic, moment_matching")
+
+    if basis not in ["monomial", "laguerre"]:
+        sys.exit("Invalid basis for a chain. Valid bases are: monomial, laguerre")
+
+    k = np.asarray(k, dtype = float)
+    is_call = np.asarray(is_call, dtype = bool)
+    is_american = np.asarray(is_american, dtype = bool)
+
+    samples = np.empty([n, k.shape[0]])
+
+    if not np.any(is_american):
+
+        # Exact sampling is unbiased, so only the terminal date needs to be simulated
+        time_grid = None
+        if scheme == "exact":
+            time_grid = [t, t_terminal]
+
+        s_T = simulate_gbm_terminal(n, s, r, div_yield, t, t_terminal, dt, sigma, method = scheme, seed = seed,
+                                    time_grid = time_grid, variance_reduction = variance_reduction,
+                                    sampling = sampling)
+
+        samples[:] = np.exp(- r * t_terminal) * chain_payoff(s_T, k, is_call)
+
+    else:
+
+        paths = simulate_gbm(n, s, r, div_yield, t, t_terminal, dt, sigma, method = scheme, seed = seed,
+                             variance_reduction = variance_reduction, sampling = sampling).T
+
+        samples[:, ~is_american] = np.exp(- r * t_terminal) * chain_payoff(paths[-1], k[~is_american],
+                                                                           is_call[~is_american])
+
+        samples[:, is_american] = chain_longstaff_schwartz(paths, s, k[is_american], is_call[is_american], r,
+                                                           t_terminal, basis)
+
+    # Average antithetic pairs
+    samples = adjust_samples(samples, variance_reduction)
+
+    prices = np.mean(samples, axis = 0)
+
+    # An American option is worth at least its immediate exercise
+    prices[is_american] = np.maximum(prices[is_american], chain_payoff(s, k, is_call)[is_american])
+
+    if full_output:
+        return MonteCarloResult(prices, np.std(samples, axis = 0, ddof = 1) / np.sqrt(samples.shape[0]), n)
+
+    return prices
+
+
+def chain_longstaff_schwartz(paths, s_0, k, is_call, r, t_terminal, basis):
+    '''Discounted Longstaff-Schwartz cash flows of every path (rows) and contract (columns)
+
+    paths is the time major (time steps x paths) simulation.
+    '''
+
+    t_total = paths.shape[0] - 1
+    dt_sim = t_terminal / float(t_total)
+
+    # The cash flows are kept discounted to time 0, so no stopping times are needed. At i = M = T, use value at T
+    discounted_cash_flow = np.exp(-r * t_total * dt_sim) * chain_payoff(paths[-1], k, is_call)
+
+    # Iterate backwards
+    for i in range(t_total - 1, 0, -1):
+
+        s_ik = paths[i]
+        yvalues = np.exp(r * i * dt_sim) * discounted_cash_flow
+
+        # Exercise values of every contract, and which paths each is in the money on
+        s_ik_v = chain_payoff(s_ik, k, is_call)
+        itm = s_ik_v > 0
+
+        # One basis shared by every contract, scaled by s_0 to keep the normal equations well conditioned
+        B = basis_matrix(s_ik / s_0, 1.0, basis)
+
+        # Normal equations of each contract's fit on its in the money paths, as (contracts, basis, basis).
+        # Both are matrix products over the paths.
+        basis_products = (B[:, :, None] * B[:, None, :]).reshape(B.shape[0], -1)
+        gram = (itm.T.astype(float) @ basis_products).reshape(-1, B.shape[1], B.shape[1])
+        moments = np.where(itm, yvalues, 0).T @ B
+
+        # The pseudo inverse also copes with contracts that have too few in the money paths to fit
+        params = (np.linalg.pinv(gram) @ moments[:, :, None])[:, :, 0]
+
+        C_hat = B @ params.T
+
+        # In the money paths that are worth more exercised than continued
+        exercise = np.logical_and(itm, s_ik_v >= C_hat)
+
+        discounted_cash_flow[exercise] = np.exp(-r * i * dt_sim) * s_ik_v[exercise]
+
+    return discounted_cash_flow
+
+
+def chain_payoff(s_T, k, is_call):
+    '''Option values at T of every price in s_T (rows) and contract (columns)
+    '''
+
+    intrinsic = np.subtract.outer(s_T, k)
+
+    return np.maximum(np.where(is_call, intrinsic, - intrinsic), 0)
+
+
+def get_normals_variance_reduction(variance_reduction):
+    '''The part of the variance reduction that is done when drawing the normals of the simulation
+    '''
+
+    if variance_reduction in ["antithetic", "moment_matching"]:
+        return variance_reduction
+
+    return None
+
+
+def adjust_samples(y, variance_reduction = None, control = None, control_mean = None):
+    '''Turn the path values y into independent samples whose mean estimates the price
+
+    Antithetic pairs (rows 2j and 2j + 1) are averaged. With a control variate, y is adjusted by the optimal
+    multiple of the control's deviation from its known mean.
+    '''
+
+    if variance_reduction == "antithetic":
+        y = 0.5 * (y[0::2] + y[1::2])
+
+    elif variance_reduction == "control_variate":
+        covariance = np.cov(y, control)
+
+        b = 0.0
+        if covariance[1, 1] > 0:
+            b = covariance[0, 1] / covariance[1, 1]
+
+        y = y - b * (control - control_mean)
+
+    elif variance_reduction not in [None, "moment_matching"]:
+        sys.exit("Invalid variance_reduction. Valid values are: antithetic, moment_matching, control_variate")
+
+    return y
+
+
+def standard_error(y):
+    '''The standard error of the mean of the samples y
+    '''
+
+    return np.std(y, ddof = 1) / np.sqrt(y.shape[0])
+
+
+def run_adaptive(simulate_chunk, seed, target_std_error, chunk_size, max_paths, max_time = None, min_samples = 2):
+    '''Simulate chunks of paths until the standard error of the running mean reaches target_std_error
+
+    simulate_chunk(n_paths, seed) returns the samples of one chunk of n_paths paths. The first chunk uses seed, and
+    later chunks continue the random stream. Only the running count, mean and sum of squared deviations (M2) are kept,
+    merged chunk by chunk in the style of Welford. The target is only tested once there are min_samples samples, so
+    that the standard error is a usable estimate when each chunk gives a single sample. Simulation also stops once
+    max_paths paths have been simulated, or after max_time seconds if given.
+
+    Returns (mean, standard error, number of paths).
+    '''
+
+    count = 0
+    mean  = 0.0
+    m2    = 0.0
+
+    n_paths = 0
+    std_error = np.inf
+    start_time = time.time()
+    chunk_seed = seed
+
+    while True:
+
+        samples = simulate_chunk(chunk_size, chunk_seed)
+        chunk_seed = None
+        n_paths = n_paths + chunk_size
+
+        count, mean, m2 = update_running_statistics(count, mean, m2, samples)
+
+        if count > 1:
+            std_error = np.sqrt(m2 / (count - 1) / count)
+
+        if (count >= min_samples and std_error <= target_std_error) or n_paths >= max_paths:
+            break
+
+        if max_time is not None and time.time() - start_time >= max_time:
+            break
+
+    return mean, std_error, n_paths
+
+
+def run_parallel(simulate_chunk, seed, n, chunk_size, n_workers):
+    '''Simulate n paths in chunks of chunk_size paths over a pool of n_workers processes
+
+    simulate_chunk(n_paths, seed, rng = rng) returns the samples of one chunk, and must be picklable. Each chunk draws
+    from its own Generator, built from a child of numpy.random.SeedSequence(seed). The children are spawned per chunk,
+    not per worker, and the chunk statistics are merged in chunk order, so the result for a given seed and chunk_size
+    is the same for any n_workers. It is not the same as the serial result, which draws from the global random state.
+
+    The standard error is estimated across all the samples of all chunks. When each chunk gives a single sample, as
+    for American options, it is the standard error across the chunk means, so it is only as good as the number of
+    chunks allows.
+
+    Returns (mean, standard error).
+    '''
+
+    chunk_paths = [min(chunk_size, n - start) for start in range(0, n, chunk_size)]
+    chunk_seeds = np.random.SeedSequence(seed).spawn(len(chunk_paths))
+    chunk_functions = [simulate_chunk] * len(chunk_paths)
+
+    if n_workers == 1:
+        chunk_statistics = list(map(simulate_chunk_statistics, chunk_functions, chunk_paths, chunk_seeds))
+    else:
+        with ProcessPoolExecutor(max_workers = n_workers) as executor:
+            chunk_statistics = list(executor.map(simulate_chunk_statistics, chunk_functions, chunk_paths, chunk_seeds))
+
+    count = 0
+    mean  = 0.0
+    m2    = 0.0
+
+    for batch_count, batch_mean, batch_m2 in chunk_statistics:
+        count, mean, m2 = merge_running_statistics(count, mean, m2, batch_count, batch_mean, batch_m2)
+
+    std_error = np.inf
+    if count > 1:
+        std_error = np.sqrt(m2 / (count - 1) / count)
+
+    return mean, std_error
+
+
+def simulate_chunk_statistics(simulate_chunk, n_paths, seed_sequence):
+    '''The count, mean and M2 of one chunk's samples, drawn from a Generator seeded by seed_sequence
+    '''
+
+    samples = simulate_chunk(n_paths, None, rng = np.random.default_rng(seed_sequence))
+
+    return update_running_statistics(0, 0.0, 0.0, samples)
+
+
+def update_running_statistics(count, mean, m2, samples):
+    '''Merge a new batch of samples into a running count, mean and M2
+    '''
+
+    batch_count = samples.shape[0]
+    batch_mean  = np.mean(samples)
+    batch_m2    = np.sum((samples - batch_mean) ** 2)
+
+    return merge_running_statistics(count, mean, m2, batch_count, batch_mean, batch_m2)
+
+
+def merge_running_statistics(count, mean, m2, batch_count, batch_mean, batch_m2):
+    '''Merge the count, mean and M2 of a batch into the running ones
+    '''
+
+    new_count = count + batch_count
+    delta     = batch_mean - mean
+
+    mean = mean + delta * batch_count / new_count
+    m2   = m2 + batch_m2 + delta ** 2 * count * batch_count / new_count
+
+    return new_count, mean, m2
+
+
+def basis_matrix(x, k, basis = "monomial"):
+    '''Evaluate the regression basis for the continuation value at every stock price in x
+
+    Parameters
+    ----------
+    x : Numpy 1D array
+        The stock prices at the current time step.
+    k : double
+        The strike price, used to scale the Laguerre bases.
+    basis : {"monomial", "laguerre", "weighted_laguerre"}, default "monomial"
+        "monomial" is 1, x, x^2, x^3. "laguerre" is the first 4 Laguerre polynomials of x / k.
+        "weighted_laguerre" also weights those by exp(-x / (2k)), as in Longstaff and Schwartz.
+
+    Returns
+    -------
+    B : Numpy 2D array
+        A len(x) x 4 matrix with one basis function per column.
+    '''
+
+    if basis == "monomial":
+        return np.column_stack((np.ones(x.shape[0]), x, x ** 2, x ** 3))
+
+    u = x / k
+
+    laguerre = np.column_stack((np.ones(x.shape[0]),
+                                1 - u,
+                                (u ** 2 - 4 * u + 2) / 2,
+                                (- u ** 3 + 9 * u ** 2 - 18 * u + 6) / 6))
+
+    if basis == "laguerre":
+        return laguerre
+
+    elif basis == "weighted_laguerre":
+        return np.exp(- u / 2)[:, None] * laguerre
+
+    else:
+        sys.exit("Invalid basis. Valid bases are: monomial, laguerre, weighted_laguerre")
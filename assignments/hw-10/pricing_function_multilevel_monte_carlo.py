@@ -0,0 +1,151 @@
+from gbm_simulator import normal_sampler, dispatch_simulation
+from pricing_function_monte_carlo import MonteCarloResult
+import numpy as np
+import sys
+
+def pricing_function_multilevel_monte_carlo(option_type, call_put, option_price_at_T):
+    '''Retrieve the multilevel Monte Carlo pricing function for a european call/put
+
+    Level l simulates the GBM with n_steps_0 * 2^l Euler or Milstein steps. The price is the sum of the level 0
+    estimate and the estimates of the corrections E[P_l - P_(l-1)]. Each correction is simulated on coupled
+    fine/coarse path pairs, where the coarse path is driven by the sums of pairs of the fine Brownian increments.
+    The corrections then have a small variance, so few paths are needed on the expensive fine levels.
+
+    The number of paths of each level is chosen to hit the target_rmse option, following Giles (2008). Half of the
+    mean squared error goes to the variance, which sets the paths of level l proportional to sqrt(V_l / C_l), where
+    V_l is the sample variance of the level and C_l its number of time steps. The other half goes to the bias, and
+    levels are added until the remaining bias is small enough, up to max_levels. The corrections shrink like
+    2^(-alpha l), where alpha is fit to the level means (see remaining_bias()), so the remaining bias is about
+    |Y_L| / (2^alpha - 1). As in Giles' test, |Y_L| is taken as the largest of the last (up to 3) corrections scaled
+    down to level L, so that a single small, noisy correction does not stop the refinement.
+
+    With the full_output option, a MonteCarloResult of (price, std_error, n_paths) is returned instead of the price.
+    '''
+
+    if option_type != "european":
+        sys.exit("Multilevel Monte Carlo is only available for european options.")
+
+    def pricing_function_multilevel_monte_carlo_european(s, k, r, div_yield, sigma, t_terminal, t, seed,
+                                                         target_rmse = 0.05, scheme = "milstein", n_steps_0 = 1,
+                                                         n_initial = 10000, min_levels = 2, max_levels = 10,
+                                                         full_output = False):
+
+        if scheme not in ["euler", "milstein"]:
+            sys.exit("Invalid scheme. Valid schemes are: euler, milstein")
+
+        # Set the seed
+        if seed is not None:
+            np.random.seed(seed)
+
+        discount = np.exp(- r * (t_terminal - t))
+
+        # Running count, sum and sum of squares of the samples of each level
+        counts = []
+        sums = []
+        sums_squared = []
+
+        # Paths still to simulate on each level
+        extra_paths = [n_initial] * (min_levels + 1)
+
+        while True:
+
+            for level, n_paths in enumerate(extra_paths):
+
+                if level == len(counts):
+                    counts.append(0)
+                    sums.append(0.0)
+                    sums_squared.append(0.0)
+
+                if n_paths > 0:
+                    level_sum, level_sum_squared = simulate_level(n_paths, level, s, k, r, div_yield, sigma,
+                                                                  t_terminal, t, n_steps_0, scheme,
+                                                                  option_price_at_T)
+                    counts[level] += n_paths
+                    sums[level] += discount * level_sum
+                    sums_squared[level] += discount ** 2 * level_sum_squared
+
+            counts_array = np.array(counts, dtype = float)
+            means = np.array(sums) / counts_array
+            variances = np.maximum(np.array(sums_squared) / counts_array - means ** 2, 0)
+            costs = n_steps_0 * 2.0 ** np.arange(len(counts))
+
+            # Optimal paths per level for a variance of target_rmse^2 / 2
+            optimal_paths = np.ceil(2 / target_rmse ** 2 * np.sqrt(variances / costs)
+                                    * np.sum(np.sqrt(variances * costs)))
+
+            extra_paths = [int(n_paths) for n_paths in np.maximum(optimal_paths - counts_array, 0)]
+
+            if any(n_paths > 0 for n_paths in extra_paths):
+                continue
+
+            bias = remaining_bias(means)
+
+            if bias <= target_rmse / np.sqrt(2) or len(counts) > max_levels:
+                break
+
+            extra_paths = extra_paths + [n_initial]
+
+        v_0 = np.sum(means)
+
+        if full_output:
+            return MonteCarloResult(v_0, np.sqrt(np.sum(variances / counts_array)), int(np.sum(counts_array)))
+
+        return v_0
+
+    return pricing_function_multilevel_monte_carlo_european
+
+
+def remaining_bias(means):
+    '''Estimate the bias left after the last level from the level means, following Giles (2015)
+
+    alpha is the slope of -log2 |Y_l| over the correction levels l >= 1, kept in [0.5, 1], or 1 with a single
+    correction. Both schemes have a weak order of 1, so a steeper fit is only noise and would understate the bias.
+    The remaining bias is then max(|Y_L|, |Y_(L-1)| / 2^alpha, |Y_(L-2)| / 2^(2 alpha)) / (2^alpha - 1).
+    '''
+
+    levels = np.arange(1, len(means))
+    corrections = np.abs(np.asarray(means[1:]))
+
+    alpha = 1.0
+    if len(levels) > 1 and np.all(corrections > 0):
+        alpha = min(1.0, max(0.5, -1 * np.polyfit(levels, np.log2(corrections), 1)[0]))
+
+    last = corrections[::-1][:3]
+    scaled = last * 2.0 ** (-alpha * np.arange(last.shape[0]))
+
+    return np.max(scaled) / (2 ** alpha - 1)
+
+
+def simulate_level(n, level, s, k, r, div_yield, sigma, t_terminal, t, n_steps_0, scheme, option_price_at_T):
+    '''Sum and sum of squares of the n samples of P_l - P_(l-1) (just P_0 on level 0), undiscounted
+
+    The paths are simulated in chunks of about 1 million time steps to bound memory.
+    '''
+
+    n_steps = n_steps_0 * 2 ** level
+    dt_fine = (t_terminal - t) / n_steps
+    chunk_size = max(1, 1000000 // n_steps)
+
+    sampler = normal_sampler(n_steps, dt_fine)
+
+    level_sum = 0.0
+    level_sum_squared = 0.0
+
+    for start in range(0, n, chunk_size):
+
+        n_chunk = min(chunk_size, n - start)
+
+        z_fine = sampler(n_chunk)
+        s_fine = dispatch_simulation(n_chunk, s, r, div_yield, dt_fine, sigma, z_fine, scheme)
+        y = option_price_at_T(s_fine[:, -1], k)
+
+        if level > 0:
+            # The coarse Brownian increment over 2 fine steps is their sum, and is standardized by sqrt(2 dt)
+            z_coarse = (z_fine[:, 0::2] + z_fine[:, 1::2]) / np.sqrt(2)
+            s_coarse = dispatch_simulation(n_chunk, s, r, div_yield, 2 * dt_fine, sigma, z_coarse, scheme)
+            y = y - option_price_at_T(s_coarse[:, -1], k)
+
+        level_sum += np.sum(y)
+        level_sum_squared += np.sum(y ** 2)
+
+    return level_sum, level_sum_squared
@@ -1,21 +1,26 @@
-from thomas import thomas_solver
-from brennan import brennan_solver
+from thomas import thomas_factored_solver
+from brennan import brennan_factored_solver
 from SOR import sor_solver
 from PSOR import psor_solver
 
 def get_solver_function(option_type, solver):
+    '''Retrieve the linear solver for the FDM engine
+
+    Direct solvers (and the explicit method, which has no solver) work on a
+    matrix that has already been factored with thomas.thomas_factor().
+    '''
 
     if(option_type == "european"):
-        if(solver == "direct"):
-            solver_function = thomas_solver
-        else:
+        if(solver == "iterative"):
             solver_function = sor_solver
+        else:
+            solver_function = thomas_factored_solver
 
 
     else: # American
-        if(solver == "direct"):
-            solver_function = brennan_solver
-        else:
+        if(solver == "iterative"):
             solver_function = psor_solver
+        else:
+            solver_function = brennan_factored_solver
 
     return solver_function
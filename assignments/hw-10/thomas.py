@@ -11,61 +11,115 @@ def thomas_solver(A, b):
 
     Parameters
     ----------
-    A : Numpy matrix
-        A tridiagonal matrix to solve using the Thomas algorithm
+    A : tuple of 3 Numpy 1D arrays
+        The (sub, main, super) diagonals of a tridiagonal matrix, each of length N.
+        sub[i] = A[i, i - 1] and sup[i] = A[i, i + 1], so sub[0] and sup[N - 1] are unused.
     b : Numpy array
-        The right hand side of Ax = b
+        The right hand side of Ax = b. This can also be a (N, K) array holding K right hand sides as columns,
+        in which case the diagonals of A can be (N, K) as well to solve K different systems at once.
 
     Returns
     -------
     x : Numpy array
-        The solution to the linear system.
+        The solution to the linear system, with the same shape as b.
     '''
 
-    [A_reduced, b_reduced] = forward_step(A.copy(), b.copy())
+    x = thomas_factored_solver(thomas_factor(A), b)
 
-    x = backward_step(A_reduced, b_reduced)
+    return x
+
+def thomas_factored_solver(A_factored, b):
+    '''
+    Solve the linear system Ax = b using a Thomas factorization of A from thomas_factor().
+
+    Only the right hand side is swept forward, so when A is the same for many
+    right hand sides the elimination of A is paid for once.
+
+    Like thomas_solver(), b can be a (N, K) array of K right hand sides. Every step of the
+    sweeps then operates on a whole row of K values at once.
+
+    Parameters
+    ----------
+    A_factored : tuple of 3 Numpy 1D arrays
+        The (multipliers, reduced main, super) diagonals returned by thomas_factor().
+    b : Numpy array
+        The right hand side of Ax = b, either (N,) or (N, K).
+
+    Returns
+    -------
+    x : Numpy array
+        The solution to the linear system, with the same shape as b.
+    '''
+
+    b_reduced = forward_sweep(A_factored, b.copy())
+
+    x = backward_step(A_factored, b_reduced)
 
     return x
 
-def forward_step(A, b):
+def thomas_factor(A):
+    '''
+    Run the forward elimination of the Thomas algorithm on A alone.
 
+    Returns the (multipliers, reduced main, super) diagonals. The multipliers
+    are gamma_i / alpha_(i-1) and are what the forward step applies to b.
 
-    N = b.shape[0]
+    The diagonals can be (N, K) arrays, to factor K tridiagonal systems at once.
+    '''
+
+    sub_diag, main_diag, sup_diag = A
+
+    # Only the main diagonal is altered, the subdiagonal is implicitly set to 0
+    main_reduced = main_diag.copy()
+    multipliers  = np.zeros(main_diag.shape)
+
+    N = main_diag.shape[0]
 
     for i in range(1, N): # 1 to N-1
 
-        alpha_i   = A[i,     i    ]
-        alpha_i_1 = A[i - 1, i - 1]
-        beta_i_1  = A[i - 1, i    ]
-        gamma_i   = A[i,     i - 1]
+        alpha_i   = main_reduced[i    ]
+        alpha_i_1 = main_reduced[i - 1]
+        beta_i_1  = sup_diag[i - 1]
+        gamma_i   = sub_diag[i]
+
+        multipliers[i] = gamma_i / alpha_i_1
 
         # Alter alpha
-        A[i, i] = alpha_i - beta_i_1 * (gamma_i / alpha_i_1)
+        main_reduced[i] = alpha_i - beta_i_1 * multipliers[i]
+
+    return multipliers, main_reduced, sup_diag
 
-        # Set gamma to 0
-        A[i, i-1] = 0
+def forward_sweep(A_factored, b):
+
+    multipliers = A_factored[0]
+
+    N = b.shape[0]
+
+    for i in range(1, N): # 1 to N-1
 
         # Alter b
-        b[i] = b[i] - b[i-1] * (gamma_i / alpha_i_1)
+        b[i] = b[i] - b[i-1] * multipliers[i]
+
+    return b
 
-    return A, b
+def backward_step(A_factored, b_reduced):
 
-def backward_step(A_reduced, b_reduced):
+    main_reduced = A_factored[1]
+    sup_diag     = A_factored[2]
 
     N = b_reduced.shape[0]
-    x = np.zeros(N)
+    x = np.zeros(b_reduced.shape)
 
     # Set the last value of x, known
-    x[N-1] = b_reduced[N-1] / A_reduced[N-1, N-1]
+    x[N-1] = b_reduced[N-1] / main_reduced[N-1]
 
     for i in reversed(range(N-1)): # N-2 to 0
 
         b_i     = b_reduced[i]
-        beta_i  = A_reduced[i, i + 1]
-        alpha_i = A_reduced[i, i]
+        beta_i  = sup_diag[i]
+        alpha_i = main_reduced[i]
 
         # Iterate x
         x[i] = (b_i - beta_i * x[i + 1]) / alpha_i
 
-    return x
\ No newline at end of file
+    return x